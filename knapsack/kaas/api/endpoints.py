@@ -1,21 +1,49 @@
+from django.conf import settings
+from django.db.models import Count, Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import authentication, permissions
 from django.core.exceptions import ValidationError
+import base64
+import uuid
 
+from kaas.blobs import dump_json, iter_blob
 from kaas.models import KnapsackTask
-from kaas.tasks import task_driver, solve_knapsack, SOLVER_TYPES, SOLVER_DEFAULT
+from kaas.completion import TaskDoneSubscription
+from kaas.tasks import task_driver, batch_driver, solve_knapsack, SOLVER_TYPES, SOLVER_DEFAULT
 from kaas.api.serializers import KnapsackTaskSerializer, KnapsackTaskDetailSerializer
 from kaas.forms import knapsack_textarea_field_validation
 
 
+def _encode_cursor(task):
+    "opaque cursor pointing right behind the given task in the list ordered by (-task_created, -id)"
+    return base64.urlsafe_b64encode('{}|{}'.format(task.task_created.isoformat(), task.id).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    "task creation time and id of a cursor, raises ValueError if it is not valid"
+    try:
+        created, task_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        created = parse_datetime(created)
+        task_id = uuid.UUID(task_id)
+    except ValueError:  # also bad base64, utf-8 or uuid
+        created = None
+    if created is None:
+        raise ValueError("Invalid cursor!")
+    return created, task_id
+
+
 class KnapsackTaskListAPI(APIView):
     """
     API for list of knapsack tasks of current user (GET, POST)
       - To achieve pagination of results during GET, use ?start=S&limit=L to get slice [S:S+L]
       - default: [0:10]
+      - deep pages are cheaper by ?cursor=C&limit=L, where C is taken from X-Next-Cursor header
+        (or Link header with rel="next") of the previous page
     """
     authentication_classes = (authentication.TokenAuthentication, authentication.SessionAuthentication)
     permission_classes = (permissions.IsAuthenticated,)
@@ -29,9 +57,30 @@ class KnapsackTaskListAPI(APIView):
         start = int(request.GET.get('start', 0))
         limit = int(request.GET.get('limit', 10))
 
-        tasks = KnapsackTask.objects.filter(user=request.user).order_by('-task_created')[start:start+limit]
+        #only columns the serializer needs, owner joined in the same query
+        tasks = KnapsackTask.objects.filter(user=request.user).select_related('user') \
+            .only(*KnapsackTaskSerializer.QUERY_FIELDS).order_by('-task_created', '-id')
+        if 'cursor' in request.GET:  # keyset pagination - (user, task_created) index seeks right to the page
+            try:
+                created, task_id = _decode_cursor(request.GET['cursor'])
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            tasks = tasks.filter(Q(task_created__lt=created) | Q(task_created=created, id__lt=task_id))[:limit]
+        else:
+            tasks = tasks[start:start+limit]
+
+        tasks = list(tasks)
         serializer = KnapsackTaskSerializer(tasks, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        response = Response(serializer.data, status=status.HTTP_200_OK)
+        if tasks and len(tasks) == limit:  # there may be a next page
+            query = request.GET.copy()
+            query.pop('start', None)
+            query['cursor'] = _encode_cursor(tasks[-1])
+            query['limit'] = limit
+            response['X-Next-Cursor'] = query['cursor']
+            response['Link'] = '<{}?{}>; rel="next"'.format(request.build_absolute_uri(request.path),
+                                                            query.urlencode())
+        return response
 
     def post(self, request):
         """
@@ -57,8 +106,8 @@ class KnapsackTaskListAPI(APIView):
                 ]
             }
         }
-        :return: Celery task_id for further tracking and HTTP_201_CREATED if valid input,
-                HTTP_400_BAD_REQUEST and reason otherwise
+        :return: Celery task_id for further tracking (empty if the result was served from cache)
+                and HTTP_201_CREATED if valid input, HTTP_400_BAD_REQUEST and reason otherwise
         """
         try:
             knapsack_textarea_field_validation(request.data)
@@ -66,25 +115,127 @@ class KnapsackTaskListAPI(APIView):
             return Response({'error': e}, status=status.HTTP_400_BAD_REQUEST)
         else:
             knapsack_task_id, result = task_driver(request.data, request.user)
-            return Response({'id': knapsack_task_id, 'celery_task_id': result.task_id}, \
+            return Response({'id': knapsack_task_id,
+                             'celery_task_id': result.task_id if result is not None else '',  # no task on cache hit
+                             'cache_hit': result is None}, \
                             status=status.HTTP_201_CREATED)
 
 
+class KnapsackTaskBatchAPI(APIView):
+    """
+    API for submission of many knapsack tasks at once (POST)
+    """
+    authentication_classes = (authentication.TokenAuthentication, authentication.SessionAuthentication)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    MAX_TASKS = 100000  # maximum number of tasks in a batch
+
+    def post(self, request):
+        """
+        POST handler
+        Accepts media type 'application/json' data with a list of tasks, each of them of the format
+        accepted by POST of KnapsackTaskListAPI:
+        {
+            "tasks": [
+                {"solver_type": "DYN_PROG", "knapsack_data": {...}},
+                {"solver_type": "BRANCH_AND_BOUND", "knapsack_data": {...}}
+            ]
+        }
+        Either all tasks are valid and submitted or none of them.
+        :return: batch id and ids of created tasks (in order of submission) and HTTP_201_CREATED if valid input,
+                HTTP_400_BAD_REQUEST and reasons by task position otherwise
+        """
+        tasks = request.data.get('tasks') if isinstance(request.data, dict) else None
+        if not isinstance(tasks, list) or not tasks:
+            return Response({'error': ["Key 'tasks' must be a non-empty list of tasks!"]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(tasks) > self.MAX_TASKS:
+            return Response({'error': ["Batch can have at most {} tasks!".format(self.MAX_TASKS)]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        errors = {}
+        for i, data in enumerate(tasks):
+            try:
+                if not isinstance(data, dict):
+                    raise ValidationError("Task must be an object!")
+                knapsack_textarea_field_validation(data)
+            except ValidationError as e:
+                errors[i] = e
+        if errors:
+            return Response({'error': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        batch_id, task_ids, result = batch_driver(tasks, request.user)
+        return Response({'batch_id': batch_id,
+                         'ids': task_ids,
+                         'celery_group_id': result.id if result is not None else ''},  # no group if all cached
+                        status=status.HTTP_201_CREATED)
+
+
+class KnapsackTaskBatchDetailAPI(APIView):
+    """
+    API for progress of a batch of knapsack tasks (GET)
+    """
+    authentication_classes = (authentication.TokenAuthentication, authentication.SessionAuthentication)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, batch_id):
+        """
+        GET handler
+        :param batch_id: batch id returned by POST of KnapsackTaskBatchAPI
+        :return: aggregated progress of the batch tasks and HTTP_200_OK, 404 if batch not exist
+        """
+        try:
+            batch_id = uuid.UUID(batch_id)
+        except ValueError:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        statuses = dict(KnapsackTask.objects.filter(user=request.user, batch_id=batch_id)
+                        .values_list('status').annotate(count=Count('id')).order_by())
+        total = sum(statuses.values())
+        if not total:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        done = statuses.get('SUCCESS', 0) + statuses.get('FAILURE', 0)
+        return Response({'batch_id': batch_id,
+                         'total': total,
+                         'done': done,
+                         'progress': done / total,
+                         'statuses': statuses},
+                        status=status.HTTP_200_OK)
+
+
 class KnapsackTaskDetailAPI(APIView):
     """
     API for a single knapsack task (GET, DELETE)
+      - GET with ?wait=S blocks until the task is signalled as done, but at most S seconds, instead of polling
     """
     authentication_classes = (authentication.TokenAuthentication, authentication.SessionAuthentication)
     permission_classes = (permissions.IsAuthenticated,)
 
+    MAX_WAIT = 30  # seconds, default of settings.KAAS_MAX_WAIT
+
     def get(self, request, task_id):
         """
         GET handler
         :param task_id: knapsack task id
         :return: serialized task json (newest first) and HTTP_200_OK, 404 if task not exist
         """
-        task = get_object_or_404(KnapsackTask, id=task_id, user=request.user)
-        serializer = KnapsackTaskDetailSerializer(task)
+        try:
+            wait = min(float(request.GET.get('wait', 0)), getattr(settings, 'KAAS_MAX_WAIT', self.MAX_WAIT))
+        except ValueError:
+            return Response({'error': "'wait' must be a number of seconds!"}, status=status.HTTP_400_BAD_REQUEST)
+        if wait > 0:
+            #subscribed before the row is read, so completion in between is not missed
+            with TaskDoneSubscription(task_id) as subscription:
+                task = get_object_or_404(KnapsackTask, id=task_id, user=request.user)
+                if not task.done and subscription.wait(wait):
+                    try:
+                        task.refresh_from_db()
+                    except KnapsackTask.DoesNotExist:  # deleted meanwhile
+                        return Response(status=status.HTTP_404_NOT_FOUND)
+        else:
+            task = get_object_or_404(KnapsackTask, id=task_id, user=request.user)
+        serializer = KnapsackTaskDetailSerializer(task, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def delete(self, request, task_id):
@@ -96,3 +247,35 @@ class KnapsackTaskDetailAPI(APIView):
         task = get_object_or_404(KnapsackTask, id=task_id, user=request.user)
         task.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class KnapsackTaskBlobAPI(APIView):
+    """
+    API streaming input, result or best-so-far items of a single knapsack task (GET)
+      - large data are streamed from blob store chunk by chunk, as stored (gzip) if client accepts it
+    """
+    authentication_classes = (authentication.TokenAuthentication, authentication.SessionAuthentication)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, task_id, field):
+        """
+        GET handler
+        :param task_id: knapsack task id
+        :param field: 'input', 'result_items' or 'incumbent_items'
+        :return: json list of items and HTTP_200_OK, 404 if task or its blob not exist
+        """
+        task = get_object_or_404(KnapsackTask.objects.only('id', field, field + '_hash'), id=task_id,
+                                 user=request.user)
+        key = getattr(task, field + '_hash')
+        if not key:  # small data in the task row
+            return HttpResponse(dump_json(getattr(task, field)), content_type='application/json')
+
+        compressed = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        try:
+            chunks = iter_blob(key, compressed)
+        except KeyError:  # e.g. deleted by compact_blobs
+            return Response({'error': "Data of the task are not stored any more!"}, status=status.HTTP_404_NOT_FOUND)
+        response = StreamingHttpResponse(chunks, content_type='application/json')
+        if compressed:
+            response['Content-Encoding'] = 'gzip'
+        return response
@@ -1,3 +1,4 @@
+from django.core.urlresolvers import reverse
 from rest_framework import serializers
 
 from kaas.models import KnapsackTask
@@ -25,14 +26,23 @@ class KnapsackTaskSerializer(serializers.ModelSerializer):
         "return username of task owner"
         return obj.user.username
 
+    #model fields the serializer reads, lists load just these (with user joined) and no big json columns
+    QUERY_FIELDS = ('id', 'celery_task_id', 'status', 'solver_type', 'solver_engine', 'predicted_cost', 'done',
+                    'user', 'user__username', 'task_created', 'task_solve_start', 'task_solve_end',
+                    'task_total_duration', 'task_solution_duration',
+                    'exception_class', 'exception_msg', 'exception_traceback',
+                    'capacity', 'nitems', 'cache_hit', 'batch_id', 'result_weight', 'result_value',
+                    'result_nitems')
+
     class Meta:
         model = KnapsackTask
-        fields = ('id', 'celery_task_id', 'status', 'solver_type', 'done', 'user_name', 'task_created', \
+        fields = ('id', 'celery_task_id', 'status', 'solver_type', 'solver_engine', 'predicted_cost', \
+                  'done', 'user_name', 'task_created', \
                   'task_solve_start', 'task_solve_end', \
                   'total_duration_sec', 'solution_duration_sec', \
                   'exception_class', 'exception_msg', 'exception_traceback',
-                  'capacity', 'nitems', \
-                  'result_weight', 'result_value')
+                  'capacity', 'nitems', 'cache_hit', 'batch_id', \
+                  'result_weight', 'result_value', 'result_nitems')
 
 
 class KnapsackTaskDetailSerializer(KnapsackTaskSerializer):
@@ -40,14 +50,53 @@ class KnapsackTaskDetailSerializer(KnapsackTaskSerializer):
     Serializer for KnapsackTask model:)
      - full serialized for detailed information including input items and result items
     """
-    #durations we convert to seconds
+    #small input and result items are inlined, large ones (in blob store) are null and only
+    #referenced by url of the endpoint streaming them
+    input = serializers.SerializerMethodField('_input')
+    input_url = serializers.SerializerMethodField('_input_url')
+    result_items = serializers.SerializerMethodField('_result_items')
+    result_items_url = serializers.SerializerMethodField('_result_items_url')
+    incumbent_items = serializers.SerializerMethodField('_incumbent_items')
+    incumbent_items_url = serializers.SerializerMethodField('_incumbent_items_url')
+
+    def _inline(self, obj, name):
+        "items kept in the task row, None if they are in blob store"
+        return None if getattr(obj, name + '_hash') else getattr(obj, name)
+
+    def _url(self, obj, name):
+        "url of the endpoint streaming the items, absolute if the request is in context"
+        url = reverse('api_task_blob', args=(obj.id, name))
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+    def _input(self, obj):
+        return self._inline(obj, 'input')
+
+    def _input_url(self, obj):
+        return self._url(obj, 'input')
+
+    def _result_items(self, obj):
+        return self._inline(obj, 'result_items')
+
+    def _result_items_url(self, obj):
+        return self._url(obj, 'result_items')
+
+    def _incumbent_items(self, obj):
+        return self._inline(obj, 'incumbent_items')
+
+    def _incumbent_items_url(self, obj):
+        return self._url(obj, 'incumbent_items')
+
     class Meta:
         model = KnapsackTask
-        fields = ('id', 'celery_task_id', 'status', 'solver_type', 'done', 'user_name', 'task_created', \
+        fields = ('id', 'celery_task_id', 'status', 'solver_type', 'solver_engine', 'predicted_cost', \
+                  'done', 'user_name', 'task_created', \
                   'task_solve_start', 'task_solve_end', \
                   'total_duration_sec', 'solution_duration_sec', \
                   'exception_class', 'exception_msg', 'exception_traceback',
-                  'input', 'capacity', 'nitems', \
-                  'result_weight', 'result_value', 'result_items')
+                  'input', 'input_url', 'input_size', 'capacity', 'nitems', 'instance_hash', 'cache_hit', 'batch_id', \
+                  'result_weight', 'result_value', 'result_items', 'result_items_url', 'result_items_size', \
+                  'result_nitems', 'result_info', 'progress', \
+                  'incumbent_value', 'incumbent_items', 'incumbent_items_url')
 
 
@@ -0,0 +1,157 @@
+from functools import reduce
+import math
+
+import numpy as np
+
+#cost model calibrated by benchmark runs of uncorrelated, weakly (v = w +- R/10) and strongly (v = w + R/10)
+#correlated instances with 20 - 1000 items and weights up to 100 - 10000 and by tests/data/sample_inputs
+DP_CELL_SECONDS = 4e-9  # numpy DP, per cell of the table (n * normalized capacity or n * sum of values)
+DP_MAX_CELLS = 2 ** 34  # larger bit-packed table of take decisions (2 GB) is out of question
+BB_NODE_SECONDS = 6.5e-6  # branch and bound, per search node
+BB_EASY_RESIDUAL = 0.05  # values deviating from a linear function of weights more than this make B&B easy
+BB_HARDNESS_BITS = 2.  # exponent of nodes explored per sqrt(n) if values are exactly linear in weights
+BB_MAX_EXPONENT = 30  # nodes are capped at n * 2**30, more would be forever anyway
+BB_FIT_SAMPLE = 10000  # residual is estimated from at most this many items by predict_bb_seconds()
+
+
+def instance_features(ds):
+    """
+    Features of knapsack instance the cost model is based on
+    :param ds: Datastore instance
+    :return: dict of features
+    """
+    values = ds.value_array()
+    weights = ds.weight_array()
+    n = len(values)
+    integer_values = bool(np.all(np.floor(values) == values))
+    integer_weights = bool(np.all(np.floor(weights) == weights))
+
+    features = {'nitems': n,
+                'capacity': ds.capacity,
+                'integer_values': integer_values,
+                'integer_weights': integer_weights,
+                'value_max': float(values.max()) if n else 0.,
+                'value_sum': float(values.sum())}
+
+    correlation = 0.
+    if n > 1 and values.std() > 0 and weights.std() > 0:
+        correlation = float(np.corrcoef(values, weights)[0, 1])
+    features['correlation'] = correlation
+
+    features['residual'] = _residual(values, weights)
+
+    #DP table is sized after division by GCD, see Datastore.normalized_weights and SolverDynamicNumpy
+    if integer_weights:
+        _, capacity, divisor = ds.normalized_weights()
+        features.update({'weight_gcd': divisor, 'dp_capacity': capacity})
+    if integer_values:
+        int_values = values.astype(np.int64)
+        divisor = reduce(math.gcd, np.unique(int_values).tolist(), 0) or 1
+        features.update({'value_gcd': divisor, 'dp_value_sum': int(int_values.sum()) // divisor})
+    return features
+
+
+def _residual(values, weights):
+    """
+    RMS of relative deviations of values from a linear function of weights, 0 for strongly correlated
+    instances (v = w + const) which make B&B bounds weak, 0.1 and more for weakly correlated or independent ones
+    (unlike correlation it is not dominated by the largest items)
+    :param values: NumPy array of item values
+    :param weights: NumPy array of item weights
+    """
+    positive = values > 0
+    if np.count_nonzero(positive) <= 2 or weights.std() == 0:
+        return 1.
+    slope, intercept = np.polyfit(weights, values, 1)
+    deviations = (values - (slope * weights + intercept))[positive] / values[positive]
+    return float(np.sqrt(np.mean(deviations ** 2)))
+
+
+def _bb_seconds(nitems, residual):
+    """
+    B&B explores about n nodes if values deviate from a linear function of weights, but exponentially many
+    (in sqrt(n), as measured) when values are (almost) exactly a linear function of weights
+    """
+    hardness = max(0., 1. - residual / BB_EASY_RESIDUAL)
+    exponent = min(BB_HARDNESS_BITS * math.sqrt(nitems) * hardness, BB_MAX_EXPONENT)
+    return max(nitems, 1) * 2 ** exponent * BB_NODE_SECONDS
+
+
+def predict_bb_seconds(knapsack_data):
+    """
+    Predicted run time of B&B straight from json data, much cheaper than predict_costs(instance_features())
+    for large instances: no datastore is built and the residual is fitted to an evenly spaced sample of items
+    :param knapsack_data: json with knapsack data, described in Datastore class
+    :return: predicted seconds
+    """
+    items = knapsack_data['items']
+    sample = items[::max(1, len(items) // BB_FIT_SAMPLE)]
+    values = np.array([item['value'] for item in sample], dtype=np.float64)
+    weights = np.array([item['weight'] for item in sample], dtype=np.float64)
+    return _bb_seconds(len(items), _residual(values, weights))
+
+
+def _dp_cells(features):
+    "table size of numpy DP, which picks the cheaper of capacity and value indexing, None if DP is not applicable"
+    sizes = []
+    if features['integer_weights']:
+        sizes.append(features['dp_capacity'] + 1)
+    if features['integer_values']:
+        sizes.append(features['dp_value_sum'] + 1)
+    if not sizes:
+        return None
+    return features['nitems'] * min(sizes)
+
+
+def _fptas_cells(features, epsilon):
+    "table size of value indexed DP of FPTAS over values scaled as SolverFPTAS does"
+    n = features['nitems']
+    scale = epsilon * features['value_max'] / n if n else 1.
+    if features['integer_values']:
+        scale = max(scale, 1.)
+    return n * (features['value_sum'] / scale + 1) if scale > 0 else 0
+
+
+def predict_costs(features, epsilon=None):
+    """
+    Predicted run times of the engines applicable to an instance with given features
+    :param features: dict returned by instance_features()
+    :param epsilon: allowed relative error, None if an exact solution is required
+    :return: dict solver type -> predicted seconds
+    """
+    n = features['nitems']
+    costs = {}
+
+    cells = _dp_cells(features)
+    if cells is not None and cells <= DP_MAX_CELLS:
+        costs['DYN_PROG_NUMPY'] = cells * DP_CELL_SECONDS
+
+    costs['BRANCH_AND_BOUND'] = _bb_seconds(n, features['residual'])
+
+    if epsilon is not None:
+        cells = _fptas_cells(features, epsilon)
+        if cells <= DP_MAX_CELLS:
+            costs['FPTAS'] = cells * DP_CELL_SECONDS
+    return costs
+
+
+def choose_solver(ds, epsilon=None, capacities=None):
+    """
+    Chooses the engine with the lowest predicted run time
+    :param ds: Datastore instance
+    :param epsilon: allowed relative error, None if an exact solution is required
+    :param capacities: capacity sweep, only numpy DP can run it (over integer weights)
+    :return: solver type, predicted seconds and instance features, DP over fractional weights
+             is value indexed (see _dp_cells)
+    """
+    features = instance_features(ds)
+    costs = predict_costs(features, epsilon)
+    if capacities:
+        #the sweep needs integer weights, the table is sized by the largest capacity
+        if not features['integer_weights']:
+            raise ValueError("Capacity sweep requires integer weights!")
+        features['dp_capacity'] = max([features.get('dp_capacity', 0)] +
+                                      [int(c // features.get('weight_gcd', 1)) for c in capacities])
+        return 'DYN_PROG_NUMPY', features['nitems'] * (features['dp_capacity'] + 1) * DP_CELL_SECONDS, features
+    solver_type = min(costs, key=costs.get)
+    return solver_type, costs[solver_type], features
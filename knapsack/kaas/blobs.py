@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+from django.conf import settings
+
+BLOB_STORE_DEFAULTS = {
+    'BACKEND': 'database',  # 'database' (kaas.models.Blob table) or 'filesystem'
+    'LOCATION': None,  # filesystem backend only: directory of blob files, shared by web and workers
+    'MIN_SIZE': 64 * 1024,  # bytes of json, smaller data stay in the task row, None keeps everything there
+    'COMPRESS_LEVEL': 6,  # gzip compression level
+}
+
+CHUNK_SIZE = 1 << 16  # bytes streamed at once
+
+
+def dump_json(data):
+    "compact json bytes, sizes and hashes of blobs are computed of these"
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def blob_hash(raw):
+    "content address of blob, i.e. sha256 of uncompressed data"
+    return hashlib.sha256(raw).hexdigest()
+
+
+class DatabaseBlobStore(object):
+    """
+    Blobs in a side table (kaas.models.Blob), so they never slow down queries of task rows
+    """
+    def __init__(self, compress_level=6):
+        from kaas.models import Blob
+        self.model = Blob
+        self.compress_level = compress_level
+
+    def put(self, raw):
+        """
+        Stores data unless a blob of the same content exists
+        :param raw: uncompressed bytes
+        :return: hash of the blob
+        """
+        key = blob_hash(raw)
+        if not self.model.objects.filter(hash=key).exists():
+            self.model.objects.get_or_create(hash=key, defaults={
+                'size': len(raw), 'data': gzip.compress(raw, self.compress_level)})
+        return key
+
+    def open(self, key):
+        "binary file object of gzip compressed blob, KeyError if there is no such blob"
+        try:
+            return io.BytesIO(bytes(self.model.objects.values_list('data', flat=True).get(hash=key)))
+        except self.model.DoesNotExist:
+            raise KeyError(key)
+
+    def delete_unreferenced(self, referenced, older_than):
+        """
+        Deletes blobs which are not referenced
+        :param referenced: set of hashes in use
+        :param older_than: datetime, younger blobs are kept as their tasks might not be saved yet
+        :return: number of deleted blobs
+        """
+        keys = [key for key in self.model.objects.filter(created__lt=older_than).values_list('hash', flat=True)
+                if key not in referenced]
+        for start in range(0, len(keys), 500):
+            self.model.objects.filter(hash__in=keys[start:start+500]).delete()
+        return len(keys)
+
+
+class FileBlobStore(object):
+    """
+    Blobs in gzip files of a directory, file of a blob is <location>/<first two chars of hash>/<hash>.json.gz
+    """
+    def __init__(self, location, compress_level=6):
+        self.location = location
+        self.compress_level = compress_level
+        os.makedirs(location, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.location, key[:2], key + '.json.gz')
+
+    def put(self, raw):
+        key = blob_hash(raw)
+        path = self._path(key)
+        if os.path.exists(path):
+            os.utime(path)  # fresh again, see delete_unreferenced
+            return key
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(gzip.compress(raw, self.compress_level))
+        os.replace(tmp_path, path)  # readers never see a partial file
+        return key
+
+    def open(self, key):
+        try:
+            return open(self._path(key), 'rb')
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def delete_unreferenced(self, referenced, older_than):
+        deleted = 0
+        for root, _, files in os.walk(self.location):
+            for name in files:
+                path = os.path.join(root, name)
+                if not name.endswith('.json.gz') or name[:-len('.json.gz')] in referenced:
+                    continue
+                if os.path.getmtime(path) >= older_than.timestamp():
+                    continue
+                os.remove(path)
+                deleted += 1
+        return deleted
+
+
+_blob_store = (None, None)  # (configuration, backend instance)
+
+
+def _config():
+    return dict(BLOB_STORE_DEFAULTS, **getattr(settings, 'KAAS_BLOB_STORE', {}))
+
+
+def get_blob_store():
+    """
+    Blob store backend configured by settings.KAAS_BLOB_STORE (see BLOB_STORE_DEFAULTS)
+    :return: backend instance
+    """
+    global _blob_store
+    config = _config()
+    if _blob_store[0] == config:
+        return _blob_store[1]
+
+    backend = config['BACKEND']
+    if backend == 'database':
+        store = DatabaseBlobStore(config['COMPRESS_LEVEL'])
+    elif backend == 'filesystem':
+        store = FileBlobStore(config['LOCATION'], config['COMPRESS_LEVEL'])
+    else:
+        raise ValueError("Unknown blob store backend '%s'!" % backend)
+    _blob_store = (config, store)
+    return store
+
+
+def store_json(data):
+    """
+    Serializes data and puts them into blob store if they are large enough
+    :param data: json serializable data
+    :return: hash of the blob ('' if data are small and stay in the row) and size of json in bytes
+    """
+    raw = dump_json(data)
+    min_size = _config()['MIN_SIZE']
+    if min_size is None or len(raw) < min_size:
+        return '', len(raw)
+    return get_blob_store().put(raw), len(raw)
+
+
+def load_json(key):
+    "loads json data of blob"
+    with get_blob_store().open(key) as f:
+        return json.loads(gzip.decompress(f.read()).decode('utf-8'))
+
+
+def iter_blob(key, compressed=False):
+    """
+    Streams blob content in chunks, the blob is opened at once (not on first chunk),
+    so KeyError of a missing blob is raised before any response is started
+    :param key: hash of the blob
+    :param compressed: yield gzip data as stored (e.g. for Content-Encoding: gzip) instead of json
+    :return: iterator of bytes
+    """
+    return _iter_file(get_blob_store().open(key), compressed)
+
+
+def _iter_file(f, compressed):
+    with f:
+        source = f if compressed else gzip.GzipFile(fileobj=f)
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
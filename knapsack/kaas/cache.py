@@ -0,0 +1,165 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+RESULT_CACHE_DEFAULTS = {
+    'BACKEND': 'disk',  # 'memory', 'django', 'disk' or None to disable the cache
+    'ALIAS': 'default',  # django backend only: which of settings.CACHES to use
+    'LOCATION': None,  # disk backend only: directory of cache files, None is a directory in system temp
+    'MAX_ENTRIES': 1000,  # memory and disk backends, django cache culls on its own
+    'TTL': 24 * 3600,  # seconds, None means results never expire
+}
+
+
+def _canonical_number(x):
+    "8, 8.0 and 8e0 are the same number in json"
+    if isinstance(x, float) and x.is_integer():
+        return int(x)
+    return x
+
+
+def instance_hash(solver_type, knapsack_data, init_kwargs={}):
+    """
+    Canonical hash of a knapsack task - items are sorted by index and numbers normalized,
+    so the same instance gets the same hash whatever its json looks like
+    :param solver_type: string identifier of solver type
+    :param knapsack_data: json with knapsack data, described in Datastore class
+    :param init_kwargs: solver options, they can change the result
+    :return: hex digest
+    """
+    items = sorted((_canonical_number(item['index']), _canonical_number(item['value']),
+                    _canonical_number(item['weight']), item.get('name', ""))
+                   for item in knapsack_data['items'])
+    h = hashlib.sha256()
+    h.update(json.dumps([solver_type, _canonical_number(knapsack_data['capacity']), init_kwargs],
+                        sort_keys=True).encode('utf-8'))
+    for item in items:
+        h.update(json.dumps(item).encode('utf-8'))
+    return h.hexdigest()
+
+
+class MemoryResultCache(object):
+    """
+    Process local LRU cache with TTL, results are shared only if the web and worker processes are the same
+    (e.g. celery in eager mode)
+    """
+    def __init__(self, max_entries=1000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expiration time, result), least recently used first
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, result):
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl if self.ttl is not None else None, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class DjangoResultCache(object):
+    """
+    Cache in one of settings.CACHES, eviction is left to the cache backend
+    """
+    def __init__(self, alias='default', ttl=None):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.cache.get('kaas_result:' + key)
+
+    def set(self, key, result):
+        self.cache.set('kaas_result:' + key, result, self.ttl)
+
+
+class DiskResultCache(object):
+    """
+    Cache of json files in a directory, shared by all processes on the host.
+    Modification time of a file is its last use - it is refreshed on hit and the least recently used
+    files are removed when there are too many of them.
+    """
+    def __init__(self, location=None, max_entries=1000, ttl=None):
+        self.location = location or os.path.join(tempfile.gettempdir(), 'kaas_result_cache')
+        self.max_entries = max_entries
+        self.ttl = ttl
+        os.makedirs(self.location, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.location, key + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if self.ttl is not None and os.path.getmtime(path) + self.ttl < time.time():
+                os.remove(path)
+                return None
+            with open(path, 'r') as f:
+                result = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):  # missing, just removed by another process or half written
+            return None
+        return result
+
+    def set(self, key, result):
+        fd, tmp_path = tempfile.mkstemp(dir=self.location, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, self._path(key))  # readers never see a partial file
+        self._cull()
+
+    def _cull(self):
+        entries = [e for e in os.scandir(self.location) if e.name.endswith('.json')]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+_result_cache = (None, None)  # (configuration, backend instance)
+
+
+def get_result_cache():
+    """
+    Result cache backend configured by settings.KAAS_RESULT_CACHE (see RESULT_CACHE_DEFAULTS)
+    :return: backend instance or None if caching is disabled
+    """
+    global _result_cache
+    config = dict(RESULT_CACHE_DEFAULTS, **getattr(settings, 'KAAS_RESULT_CACHE', {}))
+    if _result_cache[0] == config:
+        return _result_cache[1]
+
+    backend = config['BACKEND']
+    if backend is None:
+        cache = None
+    elif backend == 'memory':
+        cache = MemoryResultCache(config['MAX_ENTRIES'], config['TTL'])
+    elif backend == 'django':
+        cache = DjangoResultCache(config['ALIAS'], config['TTL'])
+    elif backend == 'disk':
+        cache = DiskResultCache(config['LOCATION'], config['MAX_ENTRIES'], config['TTL'])
+    else:
+        raise ValueError("Unknown result cache backend '%s'!" % backend)
+    _result_cache = (config, cache)
+    return cache
@@ -0,0 +1,94 @@
+import socket
+import time
+
+from django.conf import settings
+from kombu import Connection, Exchange, Queue
+
+#workers publish ids of finished tasks to a direct exchange of the broker, every API request waiting
+#for a task consumes them from its own exclusive queue bound to the task id (nothing is polled)
+DONE_EXCHANGE = Exchange('kaas_task_done', type='direct', durable=False)
+
+TASK_DONE_DEFAULTS = {
+    'BROKER': None,  # url of broker carrying the signals, None means the celery broker
+}
+
+
+def _connection():
+    "new connection to the broker carrying completion signals"
+    from knapsack.celery import app
+    broker = dict(TASK_DONE_DEFAULTS, **getattr(settings, 'KAAS_TASK_DONE', {}))['BROKER']
+    return Connection(broker) if broker else app.connection()
+
+
+def publish_done(task_ids):
+    """
+    Tells waiting clients that tasks are done, to be called once their rows are saved.
+    Signals are best effort - nobody waits for most of the tasks and waiting clients time out at worst,
+    so broker errors are ignored.
+    :param task_ids: ids of KnapsackTask
+    """
+    task_ids = [str(task_id) for task_id in task_ids]
+    if not task_ids:
+        return
+    connection = _connection()
+    try:
+        producer = connection.Producer(serializer='json')
+        for task_id in task_ids:
+            producer.publish(task_id, exchange=DONE_EXCHANGE, routing_key=task_id, declare=[DONE_EXCHANGE])
+    except (socket.error, IOError) + connection.connection_errors + connection.channel_errors:
+        pass
+    finally:
+        connection.release()
+
+
+class TaskDoneSubscription(object):
+    """
+    Subscription to completion signal of a task (context manager), made before the task row is read,
+    so that a task finishing in between is not missed
+    """
+    def __init__(self, task_id):
+        self.task_id = str(task_id)
+        self.connection = None
+        self.done = False
+
+    def __enter__(self):
+        connection = _connection()
+        try:
+            channel = connection.default_channel
+            queue = Queue('', exchange=DONE_EXCHANGE, routing_key=self.task_id,
+                          exclusive=True, auto_delete=True, durable=False)
+            self.consumer = connection.Consumer(channel, [queue], callbacks=[self._on_message], accept=['json'])
+            self.consumer.consume()
+        except (socket.error, IOError) + connection.connection_errors + connection.channel_errors:
+            connection.release()  # broker is not available, wait() returns at once
+            return self
+        self.connection = connection
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.connection is not None:
+            self.connection.release()
+            self.connection = None
+
+    def _on_message(self, body, message):
+        self.done = True
+        message.ack()
+
+    def wait(self, timeout):
+        """
+        Blocks until the task is signalled as done or timeout elapses
+        :param timeout: seconds
+        :return: True if the task is done
+        """
+        deadline = time.monotonic() + timeout
+        while not self.done and self.connection is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                self.connection.drain_events(timeout=remaining)
+            except socket.timeout:
+                break
+            except self.connection.connection_errors + self.connection.channel_errors:
+                break
+        return self.done
@@ -3,8 +3,9 @@ from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 import json
 import sys
+import uuid
 
-from kaas.tasks import SOLVER_TYPES
+from kaas.tasks import SOLVER_TYPES, AUTO_OPTIONS
 
 
 class LoginForm(forms.Form):
@@ -66,6 +67,25 @@ def knapsack_textarea_field_validation(jdata):
     if not st in SOLVER_TYPES.keys():
         raise ValidationError("'solver_type' {} not supported!".format(st))
 
+    #optional solver options passed to solver constructor
+    if not type(jdata.get('init_kwargs', {})) is dict:
+        raise ValidationError("'init_kwargs' must be an object of solver options!")
+
+    #automatic solver selection takes just a few options common to all engines
+    if SOLVER_TYPES[st].get('auto'):
+        for k, v in jdata.get('init_kwargs', {}).items():
+            if k not in AUTO_OPTIONS:
+                raise ValidationError("Option '{}' is not supported by 'solver_type' {}!".format(k, st))
+            if k == 'epsilon' and (not type(v) in (int, float) or not 0 < v < 1):
+                raise ValidationError("'epsilon' must be a number in (0, 1)!")
+
+    #optional id of a previous task whose solution is used as a warm start
+    if 'parent_task_id' in jdata:
+        try:
+            uuid.UUID(str(jdata['parent_task_id']))
+        except ValueError:
+            raise ValidationError("'parent_task_id' {} is not a valid task id!".format(jdata['parent_task_id']))
+
     #mandatory keys of items
     knapsack_data = jdata['knapsack_data']
     mandatory_keys = ("num_items", "capacity", "items")
@@ -86,6 +106,17 @@ def knapsack_textarea_field_validation(jdata):
     if len(knapsack_data['items']) != knapsack_data['num_items']:
         raise ValidationError("'num_items' != the actual number of items in item list!")
 
+    #optional further capacities for capacity sweep in a single task
+    if 'capacities' in knapsack_data:
+        capacities = knapsack_data['capacities']
+        if not SOLVER_TYPES[st].get('accepts_capacities'):
+            raise ValidationError("'capacities' are not supported by 'solver_type' {}!".format(st))
+        if not type(capacities) is list or not capacities:
+            raise ValidationError("'capacities' value must be a non-empty list!")
+        for c in capacities:
+            if not type(c) in (int, float) or c < 0:
+                raise ValidationError("Capacity {} in 'capacities' must be a number >= 0!".format(c))
+
     items = knapsack_data['items']
     for i, item in enumerate(items):
         mandatory_keys = ("index", "value", "weight")
@@ -96,5 +127,7 @@ def knapsack_textarea_field_validation(jdata):
                 raise ValidationError("Key '{}' of item {} not type int or float!".format(k, i))
             if item[k] < 0:
                 raise ValidationError("Value {} of key '{}' of item {} cannot be <0!".format(item[k], k, i))
+        if 'capacities' in knapsack_data and item['weight'] != int(item['weight']):
+            raise ValidationError("Capacity sweep requires integer weights, weight of item {} is not!".format(i))
 
     return json.dumps(jdata)
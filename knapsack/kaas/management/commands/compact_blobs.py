@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand
+
+from kaas.blobs import get_blob_store
+from kaas.models import KnapsackTask
+
+BLOB_FIELDS = ('input', 'result_items', 'incumbent_items')
+
+
+class Command(BaseCommand):
+    help = "Moves large inputs, result and best-so-far items still kept in task rows to blob store " \
+           "and deletes blobs no task refers to (e.g. of deleted tasks)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-offload', action='store_true', help="only delete unreferenced blobs")
+        parser.add_argument('--grace', type=float, default=1.,
+                            help="hours, younger blobs are kept as their tasks might not be saved yet")
+
+    def handle(self, *args, **options):
+        if not options['no_offload']:
+            moved = 0
+            for field in BLOB_FIELDS:
+                tasks = KnapsackTask.objects.filter(**{field + '_hash': ''}).only('id', field, field + '_hash')
+                for task in tasks.iterator():
+                    task.set_blob_field(field, task.get_blob_field(field))
+                    if getattr(task, field + '_hash'):
+                        task.save(update_fields=[field, field + '_hash', field + '_size'])
+                        moved += 1
+            self.stdout.write("%d fields moved to blob store" % moved)
+
+        referenced = set()
+        for field in BLOB_FIELDS:
+            referenced.update(KnapsackTask.objects.exclude(**{field + '_hash': ''})
+                              .values_list(field + '_hash', flat=True))
+        older_than = datetime.now(timezone.utc) - timedelta(hours=options['grace'])
+        deleted = get_blob_store().delete_unreferenced(referenced, older_than)
+        self.stdout.write("%d unreferenced blobs deleted" % deleted)
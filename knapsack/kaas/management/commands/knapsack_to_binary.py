@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from kaas.solvers.datastore import Datastore
+
+
+class Command(BaseCommand):
+    help = "Converts knapsack json file (bare knapsack data or task request) to binary format " \
+           "loadable by Datastore.load_from_binary_file()"
+
+    def add_arguments(self, parser):
+        parser.add_argument('json_file', help="input json file")
+        parser.add_argument('binary_file', help="output binary file")
+
+    def handle(self, *args, **options):
+        ds = Datastore(columnar=True)
+        ds.load_from_json_file(options['json_file'])
+        ds.save_to_binary_file(options['binary_file'])
+        self.stdout.write("%d items written to %s" % (ds.nitems, options['binary_file']))
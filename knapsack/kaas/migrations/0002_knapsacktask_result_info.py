@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='result_info',
+            field=jsonfield.fields.JSONField(default='{}'),
+        ),
+    ]
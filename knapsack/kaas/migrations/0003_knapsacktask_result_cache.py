@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaas', '0002_knapsacktask_result_info'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='instance_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='cache_hit',
+            field=models.BooleanField(default=False),
+        ),
+    ]
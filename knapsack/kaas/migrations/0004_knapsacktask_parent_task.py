@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaas', '0003_knapsacktask_result_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='parent_task',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='child_tasks', to='kaas.KnapsackTask'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaas', '0004_knapsacktask_parent_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='batch_id',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+    ]
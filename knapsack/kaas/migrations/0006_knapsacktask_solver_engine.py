@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaas', '0005_knapsacktask_batch_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='solver_engine',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='predicted_cost',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaas', '0006_knapsacktask_solver_engine'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='knapsacktask',
+            index_together=set([('user', 'task_created')]),
+        ),
+    ]
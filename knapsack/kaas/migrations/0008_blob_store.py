@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def count_result_items(apps, schema_editor):
+    "result_nitems of existing tasks"
+    KnapsackTask = apps.get_model('kaas', 'KnapsackTask')
+    for task in KnapsackTask.objects.only('id', 'result_items').iterator():
+        if isinstance(task.result_items, list) and task.result_items:
+            KnapsackTask.objects.filter(id=task.id).update(result_nitems=len(task.result_items))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaas', '0007_knapsacktask_user_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField()),
+                ('data', models.BinaryField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='input_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='input_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='result_items_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='result_items_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='result_nitems',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_result_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kaas', '0008_blob_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='progress',
+            field=jsonfield.fields.JSONField(default='{}'),
+        ),
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='incumbent_value',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='incumbent_items',
+            field=jsonfield.fields.JSONField(default='{}'),
+        ),
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='incumbent_items_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='knapsacktask',
+            name='incumbent_items_size',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -1,10 +1,14 @@
-from django.db import models
+from collections import OrderedDict
+from django.db import connections, models
+from django.db.models import Case, Value, When
 import jsonfield
 
 from django.contrib.auth.models import User
 from datetime import timedelta
 import uuid
 
+from kaas.blobs import store_json, load_json
+
 #let's generate token for each new user
 from django.conf import settings
 from django.db.models.signals import post_save
@@ -25,6 +29,8 @@ class KnapsackTask(models.Model):
     celery_task_id = models.CharField(max_length=36, blank=True)  # celery task id is UUID and has 36 chars
     status = models.CharField(max_length=20, default='CREATED')  # 'CREATED' -> ('INITIALIZING' -> 'SOLVING') -> `SUCCESS`/`FAILURE`
     solver_type = models.CharField(max_length=30, blank=True)  # string identificator of solver types
+    solver_engine = models.CharField(max_length=30, blank=True)  # solver actually run, differs for 'AUTO' only
+    predicted_cost = models.FloatField(null=True, blank=True)  # 'AUTO' and B&B only: predicted run time in seconds
     done = models.BooleanField(default=False)  # taks solution ended, does not mean with SUCCESS
     user = models.ForeignKey(User, related_name="tasks_of_user")  # task owner
     task_created = models.DateTimeField(auto_now_add=True)  # time when user creates the task via web or API
@@ -40,14 +46,109 @@ class KnapsackTask(models.Model):
     exception_traceback = models.TextField(blank=True)
 
     #inputs to our tasks
+    #large input and result items are kept out of the row in blob store (see kaas.blobs), use get_blob_field()
     input = jsonfield.JSONField(default='{}')
+    input_hash = models.CharField(max_length=64, blank=True)  # hash of input blob, empty if input is in the row
+    input_size = models.BigIntegerField(default=0)  # size of input json in bytes
     capacity = models.FloatField(default=0.)
     nitems = models.IntegerField(default=0)
+    instance_hash = models.CharField(max_length=64, blank=True, db_index=True)  # canonical hash, see kaas.cache
+    cache_hit = models.BooleanField(default=False)  # result was served from cache, no solver has run
+    parent_task = models.ForeignKey('self', related_name='child_tasks', null=True, blank=True,
+                                    on_delete=models.SET_NULL)  # task whose solution was used as a warm start
+    batch_id = models.UUIDField(null=True, blank=True, db_index=True)  # tasks submitted together share batch id
 
     #output - only if taks ends with 'SUCCESS' and returns, empty otherwise
     result_weight = models.FloatField(default=0.)
     result_value = models.FloatField(default=0.)
     result_items = jsonfield.JSONField(default='{}')
+    result_items_hash = models.CharField(max_length=64, blank=True)  # hash of result items blob, see input_hash
+    result_items_size = models.BigIntegerField(default=0)  # size of result items json in bytes
+    result_nitems = models.IntegerField(default=0)  # number of result items, available without loading them
+    result_info = jsonfield.JSONField(default='{}')  # solver specific information, e.g. optimality gap
+
+    #during solution - the latest progress reported by solver and best-so-far solution (if the solver has one)
+    progress = jsonfield.JSONField(default='{}')  # e.g. DP rows done, B&B nodes explored and gap
+    incumbent_value = models.FloatField(null=True, blank=True)
+    incumbent_items = jsonfield.JSONField(default='{}')
+    incumbent_items_hash = models.CharField(max_length=64, blank=True)  # see input_hash
+    incumbent_items_size = models.BigIntegerField(default=0)
+
+    class Meta:
+        index_together = [('user', 'task_created')]  # task lists of a user, newest first
+
+    def set_blob_field(self, name, data):
+        """
+        Sets 'input', 'result_items' or 'incumbent_items', large data go to blob store and the row keeps just their hash
+        :param name: field name
+        :param data: json serializable data
+        """
+        for field, value in blob_field_values(name, data).items():
+            setattr(self, field, value)
+
+    def get_blob_field(self, name):
+        """
+        Gets 'input', 'result_items' or 'incumbent_items' wherever they are stored
+        :param name: field name
+        :return: json data
+        """
+        key = getattr(self, name + '_hash')
+        return load_json(key) if key else getattr(self, name)
+
+
+class Blob(models.Model):
+    """
+    Compressed content addressed blob of database blob store, see kaas.blobs
+    """
+    hash = models.CharField(max_length=64, primary_key=True)  # sha256 of uncompressed data
+    size = models.BigIntegerField()  # size of uncompressed data
+    data = models.BinaryField()  # gzip compressed data
+    created = models.DateTimeField(auto_now_add=True)
 
 
+def blob_field_values(name, data):
+    """
+    Values of 'input', 'result_items' or 'incumbent_items' field and its hash and size columns, large data go to blob store
+    :param name: field name
+    :param data: json serializable data
+    :return: dict of field name -> value
+    """
+    key, size = store_json(data)
+    values = {name: [] if key else data, name + '_hash': key, name + '_size': size}
+    if name == 'result_items':
+        values['result_nitems'] = len(data)
+    return values
+
+
+def _expression(value, field):
+    "query expression of value to be saved in field"
+    return value if hasattr(value, 'resolve_expression') else Value(value, output_field=field)
+
+
+def bulk_update_values(model, updates):
+    """
+    Saves values of many rows by a few UPDATE ... SET f = CASE WHEN pk = ... queries
+    (QuerySet.bulk_update is not available in our Django version)
+    :param model: model class
+    :param updates: list of (pk, dict of field name -> value or query expression, e.g. F() based)
+    """
+    queryset = model.objects.all()
+    groups = OrderedDict()  # rows with the same fields updated are saved together
+    for pk, values in updates:
+        groups.setdefault(tuple(sorted(values)), []).append((pk, values))
+
+    for fields, group in groups.items():
+        #every row takes two query parameters per field and one in WHERE pk IN (...)
+        batch_size = max(1, connections[queryset.db].ops.bulk_batch_size(['pk'] + list(fields) * 2, group))
+        for start in range(0, len(group), batch_size):
+            batch = group[start:start+batch_size]
+            if len(batch) == 1:
+                queryset.filter(pk=batch[0][0]).update(**batch[0][1])
+                continue
+            cases = {}
+            for name in fields:
+                field = model._meta.get_field(name)
+                cases[name] = Case(*[When(pk=pk, then=_expression(values[name], field)) for pk, values in batch],
+                                   output_field=field)
+            queryset.filter(pk__in=[pk for pk, _ in batch]).update(**cases)
 
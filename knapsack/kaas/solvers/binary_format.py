@@ -0,0 +1,77 @@
+"""
+Binary knapsack instance format, memory-mappable without any parsing.
+
+All numbers are little-endian, the file is:
+    offset  size    content
+    0       8       magic b'KNAPBIN\\0'
+    8       2       format version (uint16), currently 1
+    10      1       type of values: b'i' int64 or b'f' float64
+    11      1       type of weights: b'i' int64 or b'f' float64
+    12      1       type of capacity: b'i' int64 or b'f' float64
+    13      3       zero padding
+    16      8       number of items n (uint64)
+    24      8       capacity (int64 or float64, see above)
+    32      8*n     item values
+    32+8n   8*n     item weights
+    32+16n  8*n     item indices (int64)
+Item names are not stored.
+"""
+import mmap
+import struct
+
+import numpy as np
+
+MAGIC = b'KNAPBIN\0'
+VERSION = 1
+HEADER = struct.Struct('<8sHccc3xQ8s')
+
+_TYPES = {b'i': np.dtype('<i8'), b'f': np.dtype('<f8')}
+
+
+def _type_code(dtype):
+    return b'i' if np.issubdtype(dtype, np.integer) else b'f'
+
+
+def write_binary(f, capacity, values, weights, indices):
+    """
+    Writes knapsack instance in binary format
+    :param f: binary file object
+    :param capacity: knapsack capacity
+    :param values: NumPy array of item values (int64 or float64)
+    :param weights: NumPy array of item weights (int64 or float64)
+    :param indices: NumPy array of item indices
+    """
+    capacity = np.asarray(capacity)
+    value_type, weight_type, capacity_type = _type_code(values.dtype), _type_code(weights.dtype), \
+        _type_code(capacity.dtype)
+    f.write(HEADER.pack(MAGIC, VERSION, value_type, weight_type, capacity_type, len(values),
+                        capacity.astype(_TYPES[capacity_type]).tobytes()))
+    f.write(values.astype(_TYPES[value_type]).tobytes())
+    f.write(weights.astype(_TYPES[weight_type]).tobytes())
+    f.write(indices.astype(_TYPES[b'i']).tobytes())
+
+
+def map_binary(file_path):
+    """
+    Maps binary knapsack file into memory, arrays are read-only views of the mapping (no copy)
+    :param file_path: path to binary file
+    :return: capacity, values, weights and indices arrays
+    """
+    with open(file_path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # the mapping outlives the file object
+
+    if len(buf) < HEADER.size:
+        raise ValueError("Not a binary knapsack file: %s" % file_path)
+    magic, version, value_type, weight_type, capacity_type, n, capacity = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise ValueError("Not a binary knapsack file: %s" % file_path)
+    if version != VERSION:
+        raise ValueError("Unsupported binary knapsack format version %d!" % version)
+    if len(buf) != HEADER.size + 24 * n:
+        raise ValueError("Binary knapsack file is truncated: %s" % file_path)
+
+    capacity = np.frombuffer(capacity, dtype=_TYPES[capacity_type])[0].item()
+    values = np.frombuffer(buf, dtype=_TYPES[value_type], count=n, offset=HEADER.size)
+    weights = np.frombuffer(buf, dtype=_TYPES[weight_type], count=n, offset=HEADER.size + 8 * n)
+    indices = np.frombuffer(buf, dtype=_TYPES[b'i'], count=n, offset=HEADER.size + 16 * n)
+    return capacity, values, weights, indices
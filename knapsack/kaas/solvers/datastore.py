@@ -1,7 +1,16 @@
 from __future__ import division
+from bisect import bisect_right
+from functools import reduce
+from itertools import accumulate
 import json
+import math
 from pprint import pprint
 
+import numpy as np
+
+from kaas.solvers.binary_format import map_binary, write_binary
+from kaas.solvers.json_stream import JSONStreamReader, iter_knapsack_items
+
 
 class Item(object):
     """
@@ -15,11 +24,11 @@ class Item(object):
         self.index = index
 
     def val_density(self):
-        "returns value density of item"
+        "returns value density of item (weightless items with a value come first)"
         try:
             return self.value/self.weight
         except ZeroDivisionError:
-            return 0
+            return float('inf') if self.value > 0 else 0
 
     def to_json(self):
         return {'value': self.value,
@@ -29,15 +38,179 @@ class Item(object):
                 }
 
 
+class ItemArray(object):
+    """
+    Lazy sequence of Item objects over arrays of a columnar Datastore,
+    an Item is materialized only when it is accessed
+    """
+    def __init__(self, datastore, start=0, stop=None):
+        self.ds = datastore
+        self.start = start
+        self.stop = datastore.nitems if stop is None else stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            start, stop, step = k.indices(len(self))
+            if step != 1:
+                raise ValueError("ItemArray supports only contiguous slices!")
+            return ItemArray(self.ds, self.start + start, self.start + max(start, stop))
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError("ItemArray index out of range")
+        return self.ds.item_at(self.start + k)
+
+    def __iter__(self):
+        for k in range(self.start, self.stop):
+            yield self.ds.item_at(k)
+
+
+def _numeric_array(numbers):
+    "NumPy array of numbers, int64 if all of them are integers, float64 otherwise"
+    array = np.asarray(numbers, dtype=np.float64)
+    if np.all(np.floor(array) == array):
+        return array.astype(np.int64)
+    return array
+
+
+def _resized(array, n, size, dtype):
+    "new array of given size and dtype with the first n elements copied from array"
+    resized = np.empty(size, dtype=dtype)
+    resized[:n] = array[:n]
+    return resized
+
+
+def _densities(values, weights):
+    "value densities of items (weightless items with a value come first)"
+    with np.errstate(divide='ignore', invalid='ignore'):
+        densities = values / weights
+    weightless = weights == 0
+    densities[weightless] = np.where(values[weightless] > 0, np.inf, 0.)
+    return densities
+
+
+def _bound_tests(values, weights, capacity):
+    """
+    Upper bound reduction tests in Martello-Toth style. The lower bound is given by integral
+    Greedy solution, the upper bounds by Dantzig bound with an item forced out or in.
+     - item j is fixed in if the bound without j is below the lower bound
+     - item j is fixed out if the bound with j is below the lower bound
+    Both tests hold for all optimal solutions, so all fixings are valid at once.
+    Bounds of all items are found at once by binary searches over prefix sums of density
+    sorted items, i.e. O(n log n).
+    :param values: NumPy array of values of items with value > 0
+    :param weights: NumPy array of weights of items with 0 < weight <= capacity
+    :param capacity: knapsack capacity
+    :return: boolean arrays of items fixed in and fixed out
+    """
+    n = len(values)
+    fixed_in = np.zeros(n, dtype=bool)
+    fixed_out = np.zeros(n, dtype=bool)
+    if weights.sum() <= capacity:
+        return fixed_in, fixed_out  # all fit in, solvers handle this trivially
+
+    order = np.argsort(-_densities(values, weights), kind='mergesort')
+    v = values[order].astype(np.float64)
+    w = weights[order].astype(np.float64)
+    d = np.append(v / w, 0.)  # nothing more to add past the last item
+    pw = np.concatenate(([0.], np.cumsum(w)))
+    pv = np.concatenate(([0.], np.cumsum(v)))
+
+    s = int(np.searchsorted(pw, capacity, 'right')) - 1  # critical item
+    if s == n:
+        return fixed_in, fixed_out  # all fit in after all (rounding of the sum above)
+    lower = pv[s]
+    room = capacity - pw[s]
+    for v_j, w_j in zip(v[s+1:].tolist(), w[s+1:].tolist()):
+        if w_j <= room:
+            lower += v_j
+            room -= w_j
+
+    if values.dtype == np.int64:
+        below_lower = lambda bound: np.floor(bound + 1e-9) < lower  # integral values round the bound down
+    else:
+        below_lower = lambda bound: bound < lower - 1e-9 * max(1., abs(lower))
+
+    #item j forced out - only items taken as a whole by Dantzig bound (j <= s) can change it,
+    #all the following items move forward by weight of j
+    j = np.arange(s+1)
+    k = np.searchsorted(pw, capacity + w[j], 'right') - 1
+    without = pv[k] - v[j] + (capacity + w[j] - pw[k]) * d[k]
+    fixed_in[order[j[below_lower(without)]]] = True
+
+    #item j forced in - the rest of capacity is filled by Dantzig bound of the other items
+    room = capacity - w
+    k = np.searchsorted(pw, room, 'right') - 1
+    before_j = k < np.arange(n)  # critical item comes before j, leaving j out changes nothing
+    rest = np.where(before_j,
+                    pv[k] + (room - pw[k]) * d[k],
+                    pv[s] - v + (capacity - pw[s]) * d[s])
+    fixed_out[order[below_lower(v + rest)]] = True
+    fixed_out &= ~fixed_in
+    return fixed_in, fixed_out
+
+
+def _dominated(values, weights, capacity):
+    """
+    Finds dominated items: item j is dominated by item i if i is not heavier and not less
+    valuable than j (ties are broken by order). If all items dominating j do not fit in together
+    with j, some of them can always replace j in an optimal solution, so j can be left out.
+    Duplicate items are a special case. Sums of weights of dominating items are found
+    by a Fenwick tree over value ranks, i.e. O(n log n).
+    :param values: NumPy array of item values
+    :param weights: NumPy array of item weights
+    :param capacity: knapsack capacity
+    :return: boolean array of dominated items
+    """
+    unique = np.unique(values)
+    ranks = (len(unique) - np.searchsorted(unique, values)).tolist()  # most valuable has rank 1
+    tree = [0] * (len(unique) + 1)  # Fenwick tree of weights indexed by value rank
+    weights_list = weights.tolist()
+    dominated = np.zeros(len(values), dtype=bool)
+
+    for j in np.lexsort((-values, weights)).tolist():  # lightest first, most valuable first among equal
+        dominating_weight = 0  # weight of already seen items at least as valuable
+        r = ranks[j]
+        while r > 0:
+            dominating_weight += tree[r]
+            r -= r & -r
+
+        if dominating_weight + weights_list[j] > capacity:
+            dominated[j] = True
+
+        r = ranks[j]
+        while r < len(tree):
+            tree[r] += weights_list[j]
+            r += r & -r
+    return dominated
+
+
 class Datastore(object):
     """
     Class representing uniresal datastore for all Knapsack solvers
+     - by default items are kept as a list of Item objects
+     - in columnar mode values, weights, densities and indices are kept in NumPy arrays,
+       items is a lazy ItemArray and Item objects are materialized only when accessed,
+       which saves lots of memory and time for large inputs
     """
-    def __init__(self, sorted=False):
+    def __init__(self, sorted=False, columnar=False):
         self.nitems = 0.  # number of items
         self.capacity = 0.  # maximum capacity of Knapsack
         self.items = None
         self.sorted = sorted
+        self.columnar = columnar
+        self.values = None  # columnar mode only: array of item values
+        self.weights = None  # columnar mode only: array of item weights
+        self.densities = None  # columnar mode only: array of item value densities
+        self.indices = None  # columnar mode only: array of item indices
+        self.names = None  # columnar mode only: list of item names (None if no item has a name)
+        self.prefix_weight = None  # prefix sums of sorted items' weights, prefix_weight[k] = sum of first k
+        self.prefix_value = None  # prefix sums of sorted items' values
+        self._bound_columns = None  # columnar mode only: lazy list copies used by fractional_bound
+        self.fixed_items = []  # items fixed in the knapsack by reduce(), no longer in self.items
 
     @staticmethod
     def sort_by_value_density(items):
@@ -50,7 +223,103 @@ class Datastore(object):
 
     def set_sorted(self):
         self.sorted = True
-        self.items = self.sort_by_value_density(self.items)
+        if self.columnar:
+            self._select(np.argsort(-self.densities, kind='mergesort'))  # stable as sorted() is
+        else:
+            self.items = self.sort_by_value_density(self.items)
+        self.set_prefix_sums()
+
+    def set_prefix_sums(self):
+        "precomputes prefix sums of weights and values of (sorted) items"
+        if self.columnar:
+            self.prefix_weight = np.concatenate(([0], np.cumsum(self.weights)))
+            self.prefix_value = np.concatenate(([0], np.cumsum(self.values)))
+            self._bound_columns = None
+        else:
+            self.prefix_weight = [0] + list(accumulate(x.weight for x in self.items))
+            self.prefix_value = [0] + list(accumulate(x.value for x in self.items))
+
+    def set_columns(self, values, weights, indices, names=None):
+        """
+        Sets items of columnar datastore
+        :param values: array of item values
+        :param weights: array of item weights
+        :param indices: array of item indices
+        :param names: list of item names or None
+        """
+        self.values = values
+        self.weights = weights
+        self.indices = indices
+        self.names = names
+        self.densities = _densities(values, weights)
+        self.nitems = len(values)
+        self.items = ItemArray(self)
+
+    def item_at(self, k):
+        "materializes Item at position k of columnar datastore"
+        return Item(self.values[k].item(), self.weights[k].item(), self.indices[k].item(),
+                    self.names[k] if self.names else "")
+
+    def value_array(self):
+        "NumPy array of item values"
+        if self.columnar:
+            return self.values
+        return _numeric_array([x.value for x in self.items])
+
+    def weight_array(self):
+        "NumPy array of item weights"
+        if self.columnar:
+            return self.weights
+        return _numeric_array([x.weight for x in self.items])
+
+    def index_array(self):
+        "NumPy array of item indices"
+        if self.columnar:
+            return self.indices
+        return np.array([x.index for x in self.items], dtype=np.int64)
+
+    def _select(self, positions):
+        """
+        Keeps only items at given positions (in the given order)
+        :param positions: array of item positions
+        """
+        if self.columnar:
+            names = [self.names[p] for p in positions.tolist()] if self.names else None
+            self.set_columns(self.values[positions], self.weights[positions], self.indices[positions], names)
+        else:
+            self.items = [self.items[p] for p in positions.tolist()]
+            self.nitems = len(self.items)
+
+    def fractional_bound(self, level, weight=0., value=0.):
+        """
+        Fractional (Dantzig) upper bound on value reachable from items[level:] given
+        weight and value already in the knapsack. The same as fractional Greedy solver gives,
+        but the critical item is found by binary search over prefix sums, i.e. O(log n).
+        Requires sorted items.
+        :param level: from which item to continue
+        :param weight: weight already in the knapsack
+        :param value: value already in the knapsack
+        :return: upper bound on total value
+        """
+        room = self.capacity - weight
+        if self.columnar:
+            # bounds are computed per search node, numpy scalar arithmetic is too slow for that
+            if self._bound_columns is None:
+                self._bound_columns = (self.prefix_weight.tolist(), self.prefix_value.tolist(),
+                                       self.densities.tolist())
+            pw, pv, densities = self._bound_columns
+            k = bisect_right(pw, pw[level] + room, lo=level) - 1  # items[level:k] fit in as a whole
+            bound = value + pv[k] - pv[level]
+            if k < self.nitems:  # critical item goes in just partially
+                bound += (room - (pw[k] - pw[level])) * densities[k]
+            return bound
+
+        pw = self.prefix_weight
+        k = bisect_right(pw, pw[level] + room, lo=level) - 1  # items[level:k] fit in as a whole
+        bound = value + self.prefix_value[k] - self.prefix_value[level]
+        if k < len(self.items):  # critical item goes in just partially
+            bound += (room - (pw[k] - pw[level])) * self.items[k].density
+        return bound
 
     def load_from_json(self, data_json):
         """
@@ -77,11 +346,19 @@ class Datastore(object):
         """
         self.nitems = data_json['num_items']
         self.capacity = data_json['capacity']
-        self.items = []
 
-        for item in data_json['items']:
-            name = item.get('name', "")
-            self.items.append(Item(item['value'], item['weight'], item['index'], name))
+        if self.columnar:
+            items = data_json['items']
+            names = [item.get('name', "") for item in items]
+            self.set_columns(_numeric_array([item['value'] for item in items]),
+                             _numeric_array([item['weight'] for item in items]),
+                             np.array([item['index'] for item in items], dtype=np.int64),
+                             names if any(names) else None)
+        else:
+            self.items = []
+            for item in data_json['items']:
+                name = item.get('name', "")
+                self.items.append(Item(item['value'], item['weight'], item['index'], name))
 
         if self.sorted:
             self.set_sorted()
@@ -97,24 +374,174 @@ class Datastore(object):
 
     def load_from_json_file(self, file_path):
         """
-        loads data from json string from a file
+        loads data from json file, streamed (see load_from_json_stream)
         :param file_path: path to json file
         :return:
         """
-        with open(file_path, 'r') as f:
-            s = f.read()
-            self.load_from_json_str(s)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            self.load_from_json_stream(f)
+
+    def load_from_json_stream(self, f):
+        """
+        loads data from json file object incrementally - items go straight to the datastore
+        as they are parsed, so the whole json tree is never held in memory.
+        Knapsack data may be bare (see load_from_json) or wrapped in a task request under "knapsack_data".
+        :param f: text file object
+        :return:
+        """
+        header = {}
+        items = iter_knapsack_items(JSONStreamReader(f), header)
+
+        if self.columnar:
+            self._load_columns(items, header)
+        else:
+            self.items = [Item(item['value'], item['weight'], item['index'], item.get('name', ""))
+                          for item in items]
+            self.nitems = header['num_items']
+        self.capacity = header['capacity']
+
+        if self.sorted:
+            self.set_sorted()
+
+    def _load_columns(self, items, header):
+        """
+        fills columns from item dicts, arrays are presized by num_items if it precedes the items
+        :param items: iterable of item dicts
+        :param header: dict of knapsack data fields, filled while items are iterated
+        """
+        values = weights = indices = np.empty(0)
+        names = {}  # position -> name, just for items having one
+        n = 0
+        for item in items:
+            if n == len(values):
+                size = max(header.get('num_items', 0), 2 * n, 1024)
+                values, weights, indices = (_resized(values, n, size, np.float64),
+                                            _resized(weights, n, size, np.float64),
+                                            _resized(indices, n, size, np.int64))
+            values[n] = item['value']
+            weights[n] = item['weight']
+            indices[n] = item['index']
+            if item.get('name'):
+                names[n] = item['name']
+            n += 1
+
+        self.set_columns(_numeric_array(values[:n]), _numeric_array(weights[:n]), indices[:n],
+                         [names.get(k, "") for k in range(n)] if names else None)
+
+    def load_from_binary_file(self, file_path):
+        """
+        loads data from binary file (format is described in binary_format module).
+        In columnar mode item arrays are read-only views of the memory mapped file, nothing is parsed or copied.
+        :param file_path: path to binary file
+        :return:
+        """
+        self.capacity, values, weights, indices = map_binary(file_path)
+
+        if self.columnar:
+            self.set_columns(values, weights, indices)
+        else:
+            self.items = [Item(v, w, k) for v, w, k in zip(values.tolist(), weights.tolist(), indices.tolist())]
+            self.nitems = len(self.items)
+
+        if self.sorted:
+            self.set_sorted()
+
+    def save_to_binary_file(self, file_path):
+        """
+        saves items in current order to binary file (format is described in binary_format module), names are lost
+        :param file_path: path to binary file
+        :return:
+        """
+        with open(file_path, 'wb') as f:
+            write_binary(f, self.capacity, self.value_array(), self.weight_array(), self.index_array())
+
+    def reduce(self):
+        """
+        Reduces the problem before any solver runs, the reduced problem has the same optimal
+        solutions once items in self.fixed_items are added:
+         - items heavier than capacity and items without value are removed
+         - weightless items with a value are fixed in
+         - items are fixed in or out by upper bound reduction tests, see _bound_tests()
+         - dominated and duplicate items are removed, see _dominated()
+        What remains are the free items, typically the core around the critical item.
+        Steps are repeated while they reduce anything as fixed items free up or take capacity.
+        Residual capacity is always computed from the original one. With fractional weights it gets
+        a tolerance of rounding errors of sums, otherwise items filling it exactly could be dropped.
+        :return: dictionary with reduction statistics
+        """
+        stats = {'items_before': len(self.items), 'capacity_before': self.capacity}
+        values, weights = self.value_array(), self.weight_array()
+        alive = np.arange(len(values))  # positions of items still in the problem
+        fixed = []  # positions of items fixed in
+        capacity = self.capacity
+        tolerance = 0 if np.all(np.floor(weights) == weights) else 1e-9 * max(1., abs(capacity))
+        self.capacity += tolerance
+
+        while True:
+            useless = (weights[alive] > self.capacity) | (values[alive] <= 0)
+            weightless = (weights[alive] == 0) & ~useless
+            fixed.extend(alive[weightless].tolist())
+            free = alive[~useless & ~weightless]
+
+            fixed_in, fixed_out = _bound_tests(values[free], weights[free], self.capacity)
+            fixed.extend(free[fixed_in].tolist())
+            fixed_weights = weights[fixed].tolist()
+            if tolerance:
+                self.capacity = capacity - math.fsum(fixed_weights) + tolerance
+            else:
+                self.capacity = capacity - sum(fixed_weights)  # integers are exact
+            free = free[~(fixed_in | fixed_out)]
+
+            free = free[~_dominated(values[free], weights[free], self.capacity)]
+
+            done = len(free) == len(alive)
+            alive = free
+            if done:
+                break
+
+        self.fixed_items.extend(self.items[p] for p in fixed)
+        self._select(alive)
+        if self.sorted:
+            self.set_sorted()
+
+        stats.update({'items_after': self.nitems,
+                      'items_fixed_in': len(fixed),
+                      'items_removed': stats['items_before'] - self.nitems - len(fixed),
+                      'capacity_after': self.capacity})
+        return stats
+
+    def normalized_weights(self):
+        """
+        Integer weights and capacity divided by GCD of weights, any combination of items weighs
+        a multiple of GCD, so capacity is divided with rounding down. Capacity is also clamped
+        to the total weight as no larger capacity can be ever used.
+        Items themselves stay untouched.
+        :return: NumPy array of normalized weights, normalized capacity, GCD
+        """
+        weights = self.weight_array()
+        if not np.all(np.floor(weights) == weights):
+            raise ValueError("Capacity indexed DP requires integer weights!")  # rounding them would overfill
+        weights = weights.astype(np.int64)
+        divisor = reduce(math.gcd, np.unique(weights).tolist(), 0)
+        if divisor <= 1:
+            return weights, int(min(self.capacity, weights.sum())), 1
+        weights = weights // divisor
+        return weights, int(min(self.capacity // divisor, weights.sum())), divisor
 
     def test_trivial_0(self):
         """
         Test on trivial solution: all items heavier than knapsack capacity
         :return: true if condition for trivial solution holds
         """
-        return min([x.weight for x in self.items]) > self.capacity
+        if self.columnar:
+            return not self.nitems or self.weights.min() > self.capacity
+        return not self.items or min([x.weight for x in self.items]) > self.capacity
 
     def test_trivial_1(self):
         """
         Test on trivial solution: sum of all items' weights <= capacity - all fit in
         :return: true if condition for trivial solution holds
         """
+        if self.columnar:
+            return self.weights.sum() <= self.capacity
         return sum([x.weight for x in self.items]) <= self.capacity
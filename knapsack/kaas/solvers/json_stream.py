@@ -0,0 +1,120 @@
+import json
+
+CHUNK_SIZE = 1 << 16  # characters read from file at once
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+
+class JSONStreamReader(object):
+    """
+    Incremental json reader over a text file object
+     - the file is read in chunks and only the unconsumed rest of the last chunk is kept in memory,
+     - structure (objects and arrays) is walked by members() and elements() generators,
+       while small values (numbers, strings, single items) are decoded at once by value()
+    """
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+
+    def _fill(self):
+        "appends next chunk to unconsumed part of the buffer, returns False at the end of file"
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _error(self, msg):
+        return ValueError("%s near: %r" % (msg, self.buf[self.pos:self.pos + 20]))
+
+    def peek(self):
+        "next non-whitespace character without consuming it ('' at the end of file)"
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        "consumes given structural character"
+        if self.peek() != char:
+            raise self._error("Expecting '%s'" % char)
+        self.pos += 1
+
+    def value(self):
+        "decodes and consumes a complete json value"
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self._fill():  # value is not complete in the buffer
+                    raise
+                continue
+            #a number might continue in the next chunk, e.g. '12.' is decoded as 12 followed by '.'
+            if all(char in _NUMBER_CHARS for char in self.buf[end:]) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def _separator(self, closing):
+        "consumes ',' or closing bracket, returns True if there are more members"
+        char = self.peek()
+        self.pos += 1
+        if char == closing:
+            return False
+        if char != ',':
+            self.pos -= 1
+            raise self._error("Expecting ',' or '%s'" % closing)
+        return True
+
+    def members(self):
+        "yields keys of json object, the value of every key has to be consumed by the caller"
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise self._error("Expecting property name")
+            self.expect(':')
+            yield key
+            if not self._separator('}'):
+                return
+
+    def elements(self):
+        "yields decoded elements of json array"
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if not self._separator(']'):
+                return
+
+
+def iter_knapsack_items(reader, header):
+    """
+    Walks knapsack data, yields its items one by one and fills the rest of the fields into header.
+    Accepts both bare knapsack data (see Datastore.load_from_json) and task requests
+    with knapsack data under "knapsack_data" key.
+    When the first item is yielded, header holds all fields preceding "items" (typically num_items).
+    :param reader: JSONStreamReader instance
+    :param header: dict to be filled by num_items, capacity etc.
+    """
+    for key in reader.members():
+        if key == 'items':
+            yield from reader.elements()
+        elif key == 'knapsack_data' and reader.peek() == '{':
+            yield from iter_knapsack_items(reader, header)
+        else:
+            header[key] = reader.value()
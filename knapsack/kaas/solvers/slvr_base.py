@@ -1,4 +1,7 @@
 from abc import ABCMeta, abstractmethod
+import time
+
+PROGRESS_INTERVAL = 1.  # minimum seconds between two progress reports of a long run
 
 
 class SolverBase(metaclass=ABCMeta):
@@ -6,25 +9,77 @@ class SolverBase(metaclass=ABCMeta):
     Base solver clase defining a common interface for all types of Knapsack solvers.
     """
 
-    def __init__(self, datastore):
+    def __init__(self, datastore, reduce=False):
         self.ds = datastore  # datastore object with all items
+        self.reduce = reduce  # reduce the problem by Datastore.reduce() before solving
         self.knapsack = []  # items included in knapsack
         self.tvalue = 0.  # total value
         self.tweight = 0.  # total weight
+        self.stats = {}  # solver specific information on the solution, e.g. optimality gap
+        self.progress = None  # callback receiving dict of progress info during the run, see _report_progress()
+        self.progress_interval = PROGRESS_INTERVAL
+        self._progress_time = time.monotonic()
 
     def run(self, *args, **kwargs):
         """
-        auxiliary function performing tests on trivial solutions and solution
+        auxiliary function performing reduction, tests on trivial solutions and solution
         :return:
         """
+        if self.reduce:
+            self.stats['reduction'] = self.ds.reduce()
+
         if self.ds.test_trivial_0():
             pass  # both self.tvalue and self.tweight are zero
         elif self.ds.test_trivial_1():  # all items fit in
-            self.tvalue = sum([x.value for x in self.ds.items])
-            self.tweight = sum([x.weight for x in self.ds.items])
+            self.knapsack = list(self.ds.items)
+            self.tvalue = sum(self.ds.value_array().tolist())
+            self.tweight = sum(self.ds.weight_array().tolist())
         else:  # non-trivial solution - we have to find it
             self._solve(*args, **kwargs)
 
+        if self.reduce:  # items fixed by reduction are part of the solution
+            fixed_value = sum([x.value for x in self.ds.fixed_items])
+            self.knapsack.extend(self.ds.fixed_items)
+            self.tvalue += fixed_value
+            self.tweight += sum([x.weight for x in self.ds.fixed_items])
+            if 'upper_bound' in self.stats:
+                self.stats['upper_bound'] += fixed_value
+
+    def _progress_due(self):
+        "tests whether there is a progress callback and it is time to report progress (cheap enough per step)"
+        if self.progress is None:
+            return False
+        now = time.monotonic()
+        if now - self._progress_time < self.progress_interval:
+            return False
+        self._progress_time = now
+        return True
+
+    def _report_progress(self, info, items=None):
+        """
+        Passes progress info to the callback, items fixed by reduction are accounted for the same way
+        as in the final solution
+        :param info: dict of solver specific progress, e.g. rows done or nodes explored and upper_bound
+        :param items: best-so-far feasible items, reported as incumbent_value, incumbent_weight and incumbent_items
+        """
+        info = dict(info)
+        fixed_value = sum([x.value for x in self.ds.fixed_items])
+        if 'upper_bound' in info:
+            info['upper_bound'] += fixed_value
+        if items is not None:
+            items = list(items) + list(self.ds.fixed_items)
+            info.update({'incumbent_value': sum([x.value for x in items]),
+                         'incumbent_weight': sum([x.weight for x in items]),
+                         'incumbent_items': [x.to_json() for x in items]})
+            if 'upper_bound' in info:
+                info['gap'] = info['upper_bound'] - info['incumbent_value']
+        self.progress(info)
+
+    def _report_rows(self, done, total):
+        "progress callback of row by row DP computations"
+        if self._progress_due():
+            self._report_progress({'rows_done': done, 'rows_total': total})
+
     @abstractmethod
     def _solve(self):
         """
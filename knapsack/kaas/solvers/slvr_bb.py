@@ -1,82 +1,262 @@
+import heapq
+import itertools
+import time
+
 from kaas.solvers.slvr_base import SolverBase
 from kaas.solvers.slvr_greedy import SolverGreedy
 
+PROGRESS_NODES_MASK = 255  # time for progress report is checked once per 256 expanded nodes
+
 
 class BranchAndBoundSolver(SolverBase):
     """
     class of Branch and Bound Knapsack solver
     """
-    def __init__(self, *args, **kwargs):
-        "this solver takes more inputs than the rest, we have to extend constructor"
+    SEARCHES = ('best_first', 'depth_first', 'hybrid')
+
+    def __init__(self, *args, search='best_first', max_nodes=None, time_limit=None, incumbent=None, **kwargs):
+        """
+        this solver takes more inputs than the rest, we have to extend constructor
+        :param search: 'best_first' (highest upper bound first), 'depth_first' or 'hybrid'
+                       (best-first, but each node popped from the frontier is dived into down to a leaf)
+        :param max_nodes: maximum number of expanded nodes (None = no limit)
+        :param time_limit: maximum search time in seconds (None = no limit)
+        :param incumbent: indices of items of a known solution, e.g. of a previous task with a slightly
+                          different instance, used as the initial incumbent if it still fits and beats Greedy
+        """
         super(self.__class__, self).__init__(*args, **kwargs)
 
+        if search not in self.SEARCHES:
+            raise ValueError("Unknown Branch and Bound search '{}'!".format(search))
+        self.search = search
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.incumbent = incumbent
+        self.nodes = 0  # number of expanded nodes
+
         if not self.ds.sorted:  # this solver requires sorted items
             self.ds.set_sorted()
 
     class Node(object):
         """
         Class of node of the tree built during Branch&Bound solution
+         - nodes are kept small as there may be millions of them in the frontier:
+           no datastore reference and no copy of selected items, the items are given
+           by a chain of (level, parent chain) tuples shared with all ancestors
         """
-        def __init__(self, weight, level, value, datastore, knapsack):
+        __slots__ = ('cumul_weight', 'cumul_value', 'level', 'ubound', 'taken')
+
+        def __init__(self, weight, level, value, ubound, taken):
             self.cumul_weight = weight
             self.cumul_value = value
             self.level = level
-            self.ds = datastore
-            self.ubound = self._upper_bound()
-            self.knapsack = knapsack
-
-        def _upper_bound(self):
-            """
-            This function uses fractional Greedy solver to find
-            an upper bound on maximum profit.
-            :return: upper bound given by Greedy fractional solver
-            """
-            sgreedy = SolverGreedy(self.ds, fractional=True)
-            sgreedy.run(level=self.level, w_offset=self.cumul_weight, v_offset=self.cumul_value)
-            return sgreedy.tvalue
-
-        def go(self):
-            """
-            Procced to the next level from the given node
-            """
-            ret = []  # empty list for return values
-
-            if self.level < self.ds.nitems:
-                if (self.ds.items[self.level].weight + self.cumul_weight <= self.ds.capacity):
-                    item = self.ds.items[self.level]  # auxiliary variable
-                    ret.append(BranchAndBoundSolver.Node(item.weight + self.cumul_weight,  # we create a new left node - we take the item
-                                                         self.level + 1,
-                                                         item.value + self.cumul_value,
-                                                         self.ds,
-                                                         self.knapsack+[self.ds.items[self.level]]))
-
-                #right child we create always - we try to omit the item
-                ret.append(BranchAndBoundSolver.Node(self.cumul_weight, self.level + 1, \
-                                                     self.cumul_value, self.ds, self.knapsack))
-            return ret
-
-    def _solve(self, priority=False):
-        q = []  # we simulate priority queue
-        root = self.Node(0, 0, 0, self.ds, [])
-        q.append((root.ubound, root))
-
-        best_node = root
+            self.ubound = ubound  # upper bound given by fractional Greedy relaxation
+            self.taken = taken  # (level of last taken item, taken chain of its parent) or None
+
+    def _branch(self, node):
+        """
+        Procced to the next level from the given node
+        :param node: node to be expanded
+        :return: list of child nodes
+        """
+        ret = []  # empty list for return values
+
+        if node.level < self.ds.nitems:
+            weight = self.weights[node.level]  # auxiliary variable
+            if weight + node.cumul_weight <= self.ds.capacity:
+                #we create a new left node - we take the item, it is the next one the fractional
+                #relaxation takes as a whole, so the upper bound stays the same as for the parent
+                ret.append(self.Node(weight + node.cumul_weight,
+                                     node.level + 1,
+                                     self.values[node.level] + node.cumul_value,
+                                     node.ubound,
+                                     (node.level, node.taken)))
+
+            #right child we create always - we try to omit the item
+            ret.append(self.Node(node.cumul_weight, node.level + 1, node.cumul_value,
+                                 self.ds.fractional_bound(node.level + 1, node.cumul_weight, node.cumul_value),
+                                 node.taken))
+        return ret
+
+    def _collect(self, node):
+        "rebuilds list of selected items of the given node from its taken chain"
+        knapsack = []
+        taken = node.taken
+        while taken is not None:
+            level, taken = taken
+            knapsack.append(self.ds.items[level])
+        knapsack.reverse()
+        return knapsack
+
+    def _incumbent_positions(self):
+        """
+        Positions of incumbent items still present in the datastore, completed greedily by other items
+        which fit in - items removed or fixed in by reduction are skipped, so the result is always feasible
+        for the (reduced) datastore as long as the present incumbent items fit in together
+        :return: sorted list of positions or None if the incumbent items no longer fit in
+        """
+        positions = {index: k for k, index in enumerate(self.ds.index_array().tolist())}
+        taken = set(positions[index] for index in self.incumbent if index in positions)
+        weight = sum(self.weights[k] for k in taken)
+        if weight > self.ds.capacity:
+            return None
+
+        for k in range(self.ds.nitems):  # items are sorted by value density
+            if k not in taken and weight + self.weights[k] <= self.ds.capacity:
+                taken.add(k)
+                weight += self.weights[k]
+        return sorted(taken)
+
+    def _warm_start(self):
+        """
+        Integral Greedy solution (or the given incumbent if it is better) used as the initial
+        incumbent so that pruning starts right away
+        :return: node representing the solution
+        """
+        sgreedy = SolverGreedy(self.ds, fractional=False)
+        sgreedy.run()
+        selected, weight, value = sgreedy.selected, sgreedy.tweight, sgreedy.tvalue
+        self.stats['warm_start'] = 'greedy'
+
+        if self.incumbent is not None:
+            positions = self._incumbent_positions()
+            if positions is not None and sum(self.values[k] for k in positions) > value:
+                selected = positions
+                weight = sum(self.weights[k] for k in positions)
+                value = sum(self.values[k] for k in positions)
+                self.stats['warm_start'] = 'incumbent'
+
+        taken = None
+        for level in selected:
+            taken = (level, taken)
+        return self.Node(weight, self.ds.nitems, value, value, taken)
+
+    def _out_of_budget(self):
+        "tests whether node or time budget has been used up"
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            return True
+        return self.time_limit is not None and time.time() - self.search_start >= self.time_limit
+
+    def _update_incumbent(self, nodes):
+        """
+        Makes the best of the given nodes the incumbent if it beats the current one
+        :return: True if the incumbent improved
+        """
+        improved = False
+        for node in nodes:
+            if node.cumul_value > self.best_node.cumul_value:
+                self.best_node = node
+                improved = True
+        return improved
+
+    def _report_search(self, frontier, bound):
+        """
+        Reports progress of the search with the incumbent
+        :param frontier: number of nodes waiting in the frontier
+        :param bound: highest upper bound in the frontier
+        """
+        best_node = self.best_node
+        self._report_progress({'nodes': self.nodes,
+                               'frontier': frontier,
+                               'upper_bound': max(bound, best_node.cumul_value)}, self._collect(best_node))
+
+    def _search_best_first(self, root, dive=False):
+        """
+        Best-first search
+         - frontier is a heap keyed by negated upper bound (heapq is a min-heap),
+           a running counter breaks ties as nodes themselves are not comparable
+         - when the incumbent improves, frontier nodes which cannot beat it are dropped
+        :param root: root node
+        :param dive: when True, a popped node is followed down its first surviving child
+                     (taking the item goes first) until a leaf, siblings go to the frontier
+        :return: frontier left unexplored when budget runs out
+        """
+        counter = itertools.count()
+        q = [(-root.ubound, next(counter), root)]
 
         while q:
-            ubound, current_node = q.pop()
+            neg_ubound, _, current_node = heapq.heappop(q)
+
+            if -neg_ubound <= self.best_node.cumul_value:
+                return []  # the best bound in the frontier cannot beat the incumbent, neither can the rest
 
-            if current_node.cumul_value > best_node.cumul_value:
-                best_node = current_node
+            while current_node is not None:
+                if self._out_of_budget():
+                    return [entry[2] for entry in q] + [current_node]
 
-            new_nodes = current_node.go()
+                self.nodes += 1
+                if not self.nodes & PROGRESS_NODES_MASK and self._progress_due():
+                    self._report_search(len(q) + 1, max(-q[0][0] if q else 0, current_node.ubound))
+                new_nodes = self._branch(current_node)
+                improved = self._update_incumbent(new_nodes)
 
-            for node in new_nodes:
-                if node.ubound > best_node.cumul_value:
-                    q.append((node.ubound, node))  # it puts smallest first, we have to negate to get largest:)
+                current_node = None
+                for node in new_nodes:
+                    if node.ubound > self.best_node.cumul_value:
+                        if dive and current_node is None:
+                            current_node = node
+                        else:
+                            heapq.heappush(q, (-node.ubound, next(counter), node))
 
-            q.sort(key=lambda x: x[0])  # the last one is the one with highest upper_bound
+                if improved:  # pruning pass over the frontier with the new incumbent
+                    q = [entry for entry in q if -entry[0] > self.best_node.cumul_value]
+                    heapq.heapify(q)
+        return []
 
+    def _search_depth_first(self, root):
+        """
+        Depth-first search, taking the item is explored first
+        :param root: root node
+        :return: frontier left unexplored when budget runs out
+        """
+        stack = [root]
+
+        while stack:
+            if self._out_of_budget():
+                return [node for node in stack if node.ubound > self.best_node.cumul_value]
+
+            current_node = stack.pop()
+            if current_node.ubound <= self.best_node.cumul_value:
+                continue  # incumbent improved since the node was pushed
+
+            self.nodes += 1
+            if not self.nodes & PROGRESS_NODES_MASK and self._progress_due():
+                self._report_search(len(stack) + 1, max([node.ubound for node in stack] + [current_node.ubound]))
+            new_nodes = self._branch(current_node)
+            self._update_incumbent(new_nodes)
+
+            for node in reversed(new_nodes):  # take child ends up on top of the stack
+                if node.ubound > self.best_node.cumul_value:
+                    stack.append(node)
+        return []
 
-        self.knapsack = best_node.knapsack
+    def _solve(self):
+        """
+        Branch and Bound warm-started by Greedy solution
+         - search stops either with the proven optimum or when node/time budget runs out,
+           in the latter case the best solution found is returned together with the gap
+           between its value and the highest upper bound left in the frontier
+        """
+        self.search_start = time.time()
+        self.nodes = 0
+        self.values = self.ds.value_array().tolist()  # plain lists are the fastest for item by item access
+        self.weights = self.ds.weight_array().tolist()
+        self.best_node = self._warm_start()
+
+        root = self.Node(0, 0, 0, self.ds.fractional_bound(0), None)
+        if self.search == 'depth_first':
+            frontier = self._search_depth_first(root)
+        else:
+            frontier = self._search_best_first(root, dive=self.search == 'hybrid')
+
+        best_node = self.best_node
+        self.knapsack = self._collect(best_node)
         self.tweight = best_node.cumul_weight
-        self.tvalue = best_node.cumul_value
\ No newline at end of file
+        self.tvalue = best_node.cumul_value
+
+        upper_bound = max([best_node.cumul_value] + [node.ubound for node in frontier])
+        self.stats.update({'search': self.search,
+                           'nodes': self.nodes,
+                           'upper_bound': upper_bound,
+                           'gap': upper_bound - best_node.cumul_value,
+                           'optimal': upper_bound <= best_node.cumul_value})
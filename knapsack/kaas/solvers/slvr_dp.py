@@ -1,36 +1,493 @@
-from functools import lru_cache
+from functools import lru_cache, reduce
+import math
+import os
 import sys; sys.setrecursionlimit(10000)  # well...:)
+import tempfile
+import numpy as np
 
 from kaas.solvers.slvr_base import SolverBase
 
+HIRSCHBERG_LEAF_ITEMS = 128  # 128 bits per capacity cell take as much memory as two int64 rows
 
-class SolverDynamic(SolverBase):
+DP_PREFIX_CHECKPOINTS = 8  # number of rows stored along a kept DP table, a re-solve resumes from one of them
+
+
+def _value_dtype(values):
+    "integer values are kept exact in int64, anything else goes to float64"
+    values = np.asarray(values, dtype=np.float64)
+    return np.int64 if np.all(np.floor(values) == values) else np.float64
+
+
+def _bit_is_set(packed_row, n):
+    "tests bit n of a row packed by np.packbits (big-endian bit order)"
+    return (packed_row[n >> 3] >> (7 - (n & 7))) & 1
+
+
+def _dp_row(values, weights, capacity):
+    """
+    Runs the capacity indexed DP over the given items keeping just one row
+    :param values: NumPy array of item values
+    :param weights: NumPy array of integer item weights
+    :param capacity: knapsack capacity
+    :return: array of best values for every capacity 0..capacity
+    """
+    best = np.zeros(capacity+1, dtype=values.dtype)
+    for m in range(len(values)):
+        w = weights[m]
+        if w <= capacity:
+            np.maximum(best[w:], best[:capacity+1-w] + values[m], out=best[w:])
+    return best
+
+
+class _DPTable(object):
+    """
+    Capacity indexed DP table kept for re-solves - bit-packed take decisions plus rows at checkpoints,
+    a re-solve of an instance whose leading items and their order stayed the same and whose capacity
+    did not grow resumes from the last checkpoint within the common prefix
+    """
+    def __init__(self, values, weights, capacity, take, rows):
+        self.values, self.weights, self.capacity, self.take = values, weights, capacity, take
+        self.rows = rows  # number of processed items -> DP row after them
+
+    def lookup(self, values, weights, capacity):
+        """
+        :return: number of items whose DP rows can be reused, DP row after them
+                 and the take matrix of the table (or 0, None, None)
+        """
+        if capacity > self.capacity or values.dtype != self.values.dtype:
+            return 0, None, None
+        n = min(len(values), len(self.values))
+        differ = np.flatnonzero((values[:n] != self.values[:n]) | (weights[:n] != self.weights[:n]))
+        common = int(differ[0]) if len(differ) else n
+        reusable = max((k for k in self.rows if k <= common), default=0)
+        if not reusable:
+            return 0, None, None
+        return reusable, self.rows[reusable], self.take
+
+
+class DPTableStore(object):
+    """
+    Directory of DP tables kept by solved tasks, so that a re-solve from another process (of any host
+    sharing the directory) resumes from the table of its parent task. Modification time of a file is
+    its last use, the least recently used tables are removed when they take more than max_bytes.
+    """
+    def __init__(self, location=None, max_bytes=2**30, max_table_bytes=64 * 2**20):
+        """
+        :param location: directory of table files, None is a directory in system temp
+        :param max_bytes: total size of kept tables
+        :param max_table_bytes: larger tables are not kept
+        """
+        self.location = location or os.path.join(tempfile.gettempdir(), 'kaas_dp_tables')
+        self.max_bytes = max_bytes
+        self.max_table_bytes = max_table_bytes
+        os.makedirs(self.location, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.location, key + '.npz')
+
+    def fits(self, nitems, capacity):
+        "tests whether a table of nitems rows and capacity+1 columns is kept"
+        take_bytes = nitems * ((capacity >> 3) + 1)
+        return take_bytes + (DP_PREFIX_CHECKPOINTS + 2) * (capacity + 1) * 8 <= self.max_table_bytes
+
+    def load(self, key):
+        """
+        :param key: key of the table, e.g. task id
+        :return: _DPTable or None if there is no such table
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as f:
+                table = _DPTable(f['values'], f['weights'], int(f['capacity']), f['take'],
+                                 dict(zip(f['row_keys'].tolist(), f['rows'])))
+            os.utime(path)
+        except (OSError, KeyError, ValueError):  # missing, just removed by another process or half written
+            return None
+        return table
+
+    def save(self, key, table):
+        fd, tmp_path = tempfile.mkstemp(dir=self.location, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            keys = sorted(table.rows)
+            np.savez(f, values=table.values, weights=table.weights, capacity=table.capacity, take=table.take,
+                     row_keys=np.array(keys, dtype=np.int64), rows=np.array([table.rows[k] for k in keys]))
+        os.replace(tmp_path, self._path(key))  # readers never see a partial file
+        self._cull()
+
+    def _cull(self):
+        entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(self.location)
+                   if e.name.endswith('.npz')]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                return
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+def _dp_take_table(values, weights, capacity, parent=None, keep=False, progress=None):
+    """
+    Runs the capacity indexed DP keeping a bit-packed matrix of take decisions (one bit per table cell)
+    :param values: NumPy array of item values
+    :param weights: NumPy array of integer item weights
+    :param capacity: knapsack capacity
+    :param parent: _DPTable to resume from, if it shares leading items
+    :param keep: return the table with rows at checkpoints to be resumed from by re-solves
+    :param progress: callback(rows done, rows total) called after every row
+    :return: take matrix, number of items whose DP rows were reused, _DPTable (None unless keep)
+    """
+    best = np.zeros(capacity+1, dtype=values.dtype)  # best value for every capacity 0..C
+    take = np.zeros((len(values), (capacity >> 3) + 1), dtype=np.uint8)  # packed take decisions
+    row = np.zeros(capacity+1, dtype=bool)
+
+    start = 0
+    if parent is not None:
+        start, parent_row, parent_take = parent.lookup(values, weights, capacity)
+        if start:  # a smaller capacity just cuts the parent rows
+            best[:] = parent_row[:capacity+1]
+            take[:start] = parent_take[:start, :take.shape[1]]
+    stride = max(1, len(values) // DP_PREFIX_CHECKPOINTS)
+    rows = {start: best.copy()} if keep else {}  # checkpoints for re-solves
+
+    for m in range(start, len(values)):
+        if keep and m > start and m % stride == 0:
+            rows[m] = best.copy()
+        if progress is not None:
+            progress(m, len(values))
+        w = weights[m]
+        if w > capacity:
+            continue  # item never fits, its take row stays empty
+        candidate = best[:capacity+1-w] + values[m]  # new array, so the update below sees the old row
+        row[:w] = False
+        np.greater(candidate, best[w:], out=row[w:])
+        np.maximum(best[w:], candidate, out=best[w:])
+        take[m] = np.packbits(row)
+
+    if not keep:
+        return take, start, None
+    rows[len(values)] = best.copy()
+    return take, start, _DPTable(values, weights, capacity, take, rows)
+
+
+def _dp_select(take, weights, capacity):
+    """
+    Backward run over the take matrix collecting an optimal item set, works for any
+    capacity up to the one the table was computed for
+    :return: list of positions of selected items
+    """
+    selected = []
+    n = capacity
+    for m in range(len(take)-1, -1, -1):
+        if _bit_is_set(take[m], n):
+            n -= weights[m]
+            selected.append(m)
+    return selected
+
+
+def _dp_bitpacked(values, weights, capacity, progress=None):
+    """
+    Runs the capacity indexed DP and recovers an optimal item set from
+    a bit-packed matrix of take decisions (one bit per table cell)
+    :param values: NumPy array of item values
+    :param weights: NumPy array of integer item weights
+    :param capacity: knapsack capacity
+    :param progress: callback(rows done, rows total) called after every row
+    :return: list of positions of selected items
+    """
+    take, _, _ = _dp_take_table(values, weights, capacity, progress=progress)
+    return _dp_select(take, weights, capacity)
+
+
+def _dp_min_weight(values, weights, capacity, progress=None):
+    """
+    Runs the value indexed DP storing minimum weight for every achievable value and recovers
+    an optimal item set from a bit-packed matrix of take decisions (one bit per table cell)
+     - table is sized by the sum of values instead of capacity, which pays off for
+       large capacities and small values
+    :param values: NumPy array of integer item values
+    :param weights: NumPy array of item weights (unlike capacity indexed DP these need not be integers)
+    :param capacity: knapsack capacity
+    :param progress: callback(rows done, rows total) called after every row
+    :return: list of positions of selected items
+    """
+    total = int(values.sum())
+    infeasible = capacity + 1  # weights above capacity are all the same to us, this also prevents overflow
+    lightest = np.full(total+1, infeasible, dtype=weights.dtype)  # minimum weight for every value 0..total
+    lightest[0] = 0
+    take = np.zeros((len(values), (total >> 3) + 1), dtype=np.uint8)  # packed take decisions
+    row = np.zeros(total+1, dtype=bool)
+
+    for m in range(len(values)):
+        if progress is not None:
+            progress(m, len(values))
+        v = values[m]
+        if weights[m] > capacity or v == 0:
+            continue  # item never fits or never helps, its take row stays empty
+        candidate = lightest[:total+1-v] + weights[m]  # new array, so the update below sees the old row
+        np.minimum(candidate, infeasible, out=candidate)
+        row[:v] = False
+        np.less(candidate, lightest[v:], out=row[v:])
+        np.minimum(lightest[v:], candidate, out=lightest[v:])
+        take[m] = np.packbits(row)
+
+    #backward run from the highest value which fits in
+    selected = []
+    n = int(np.flatnonzero(lightest <= capacity)[-1])
+    for m in range(len(values)-1, -1, -1):
+        if _bit_is_set(take[m], n):
+            n -= values[m]
+            selected.append(m)
+    return selected
+
+
+def _dp_hirschberg(values, weights, capacity, lo, hi, selected):
+    """
+    Divide and conquer DP reconstruction in the style of Hirschberg
+     - items lo..hi-1 are split in halves, one row is computed for each half and
+       the best split of capacity between the halves is where their sum peaks,
+       both halves are then solved recursively with their share of capacity
+     - only two capacity-long rows are live at a time, segments short enough to fit
+       into the same memory as bits are finished by _dp_bitpacked
+    :param lo: first item position of the segment
+    :param hi: position after the last item of the segment
+    :param selected: list where positions of selected items are appended
+    """
+    if hi - lo <= HIRSCHBERG_LEAF_ITEMS:
+        selected.extend(lo + m for m in _dp_bitpacked(values[lo:hi], weights[lo:hi], capacity))
+        return
+
+    mid = (lo + hi) // 2
+    first = _dp_row(values[lo:mid], weights[lo:mid], capacity)
+    second = _dp_row(values[mid:hi], weights[mid:hi], capacity)
+    split = int(np.argmax(first + second[::-1]))  # capacity given to the first half
+    del first, second
+
+    _dp_hirschberg(values, weights, split, lo, mid, selected)
+    _dp_hirschberg(values, weights, capacity - split, mid, hi, selected)
+
+
+class SolverDynamicBase(SolverBase):
+    """
+    Base class of Dynamic programming solvers sized by capacity
+    """
+    def _normalize(self):
+        """
+        Normalizes weights and capacity by their GCD (and clamps capacity to the total weight)
+        before the DP table is sized, shrinking of the DP state space is reported in stats
+        :return: NumPy array of normalized integer weights, normalized capacity
+        """
+        weights, capacity, divisor = self.ds.normalized_weights()
+        cells_before = self.ds.nitems * (int(self.ds.capacity) + 1)
+        cells_after = self.ds.nitems * (capacity + 1)
+        self.stats.update({'dp_weight_gcd': divisor,
+                           'dp_capacity': capacity,
+                           'dp_cells_before': cells_before,
+                           'dp_cells_after': cells_after,
+                           'dp_shrink_factor': cells_before / cells_after if cells_after else 1.})
+        return weights, capacity
+
+
+class SolverDynamic(SolverDynamicBase):
     """
     Solver class for Dynamic programming
     """
     def _solve(self):
-        t = [[0 for i in range(self.ds.capacity+1)] for j in range(self.ds.nitems+1)]  #numpy.zeros((self.ds.nitems+1, self.ds.capacity))
+        weights, capacity = self._normalize()
+        weights = weights.tolist()
+        values = self.ds.value_array().tolist()
+        t = [[0 for i in range(capacity+1)] for j in range(self.ds.nitems+1)]  #numpy.zeros((self.ds.nitems+1, self.ds.capacity))
 
         for m in range(1, self.ds.nitems+1):
-            for n in range(0, self.ds.capacity+1):
-                item = self.ds.items[m-1]
-                if item.weight <= n:
-                    t[m][n] = max(t[m-1][n], item.value+t[m-1][n-item.weight])
+            self._report_rows(m-1, self.ds.nitems)
+            v = values[m-1]
+            w = weights[m-1]
+            for n in range(0, capacity+1):
+                if w <= n:
+                    t[m][n] = max(t[m-1][n], v+t[m-1][n-w])
                 else:
                     t[m][n] = t[m-1][n]
 
         #backward run to collect results
-        n = self.ds.capacity
+        n = capacity
         for m in range(self.ds.nitems, 0, -1):
             if t[m][n] != t[m-1][n]:
                 item = self.ds.items[m-1]
-                n -= item.weight
+                n -= weights[m-1]
                 self.knapsack.append(item)
                 self.tvalue += item.value
                 self.tweight += item.weight
 
 
-class SolverDynamicRecurrent(SolverBase):
+class SolverDynamicNumpy(SolverDynamicBase):
+    """
+    Solver class for Dynamic programming vectorized with NumPy
+     - a single capacity-long row is updated per item by np.maximum
+     - item selection is recovered either from a bit-packed matrix of take decisions,
+       i.e. one bit per table cell instead of a boxed int ('bitpacked'), or by
+       Hirschberg-style divide and conquer in O(capacity) memory for roughly twice
+       the compute ('hirschberg')
+     - with table_store set, bit-packed capacity indexed tables small enough are kept there under table_key
+       and a re-solve resumes from the table of parent_table. Such tables are computed without reduction,
+       reduced problems of two similar instances rarely share their leading items.
+    """
+    RECONSTRUCTIONS = ('bitpacked', 'hirschberg')
+    INDEXINGS = ('auto', 'capacity', 'value')
+
+    def __init__(self, *args, reconstruction='bitpacked', indexing='auto', capacities=None, parent_table=None,
+                 **kwargs):
+        """
+        this solver takes more inputs than the rest, we have to extend constructor
+        :param reconstruction: 'bitpacked' or 'hirschberg', see class description
+        :param indexing: 'capacity' (best value for every capacity), 'value' (minimum weight for every
+                         value, integer values only) or 'auto' which picks the one with smaller table
+        :param capacities: list of further capacities to solve for (capacity sweep), see run()
+        :param parent_table: key of the table in table_store to resume from, e.g. id of the parent task
+        """
+        super(SolverDynamicNumpy, self).__init__(*args, **kwargs)
+
+        if reconstruction not in self.RECONSTRUCTIONS:
+            raise ValueError("Unknown DP reconstruction '{}'!".format(reconstruction))
+        if indexing not in self.INDEXINGS:
+            raise ValueError("Unknown DP indexing '{}'!".format(indexing))
+        if capacities is not None and (reconstruction != 'bitpacked' or indexing == 'value'):
+            raise ValueError("Capacity sweep requires bitpacked capacity indexed DP!")
+        self.reconstruction = reconstruction
+        self.indexing = indexing
+        self.capacities = capacities
+        self.parent_table = parent_table
+        self.table_store = None  # DPTableStore, set by the caller along with table_key
+        self.table_key = None  # key the table of this solve is kept under, e.g. task id
+
+    def run(self, *args, **kwargs):
+        """
+        with capacities given, a single DP pass up to the largest capacity solves the datastore capacity
+        and all the others, results for the others go to stats['capacities'].
+        Reduction is skipped in this mode as it depends on capacity.
+        """
+        if self.capacities is None:
+            if self.reduce and self._keeps_table():
+                self.reduce = False
+                self.stats['dp_reduction_skipped'] = True
+            return super(SolverDynamicNumpy, self).run(*args, **kwargs)
+
+        weights, _, divisor = self.ds.normalized_weights()
+        total_weight = int(weights.sum())
+        sweep = [min(int(c // divisor), total_weight) for c in [self.ds.capacity] + list(self.capacities)]
+        values = self.ds.value_array()
+        take, reused = self._take_table(values.astype(_value_dtype(values)), weights, max(sweep))
+
+        value_list = values.tolist()
+        weight_list = self.ds.weight_array().tolist()
+        index_list = self.ds.index_array().tolist()
+        results = []
+        for capacity, normalized in zip(self.capacities, sweep[1:]):
+            selected = _dp_select(take, weights, normalized)
+            results.append({'capacity': capacity,
+                            'value': sum(value_list[m] for m in selected),
+                            'weight': sum(weight_list[m] for m in selected),
+                            'items': sorted(index_list[m] for m in selected)})
+
+        for m in sorted(_dp_select(take, weights, sweep[0]), reverse=True):
+            item = self.ds.items[m]
+            self.knapsack.append(item)
+            self.tvalue += item.value
+            self.tweight += item.weight
+
+        self.stats.update({'dp_weight_gcd': divisor,
+                           'dp_capacity': max(sweep),
+                           'dp_indexing': 'capacity',
+                           'dp_reused_items': reused,
+                           'capacities': results})
+
+    def _keeps_table(self):
+        """
+        Tests whether the DP table of this solve will be kept or resumed from (only bit-packed capacity
+        indexed ones are), so the problem must not be reduced
+        """
+        if self.table_store is None or self.reconstruction != 'bitpacked' or self.indexing == 'value':
+            return False
+        if _value_dtype(self.ds.weight_array()) != np.int64:
+            return False
+        weights, capacity, _ = self.ds.normalized_weights()
+        return self.parent_table is not None or self.table_store.fits(len(weights), capacity)
+
+    def _take_table(self, values, weights, capacity):
+        """
+        Runs the capacity indexed DP resuming from the parent table and keeping the table for re-solves,
+        if there is a table store
+        :return: take matrix, number of items whose DP rows were reused
+        """
+        if self.table_store is None:
+            return _dp_take_table(values, weights, capacity, progress=self._report_rows)[:2]
+        parent = self.table_store.load(self.parent_table) if self.parent_table is not None else None
+        keep = self.table_key is not None and self.table_store.fits(len(values), capacity)
+        take, reused, table = _dp_take_table(values, weights, capacity, parent, keep, self._report_rows)
+        if keep:
+            self.table_store.save(self.table_key, table)
+        return take, reused
+
+    def _choose_indexing(self, values, capacity):
+        """
+        Picks cheaper DP table indexing, value indexing needs integer values and has
+        no linear memory reconstruction
+        :param values: NumPy array of item values (already divided by their GCD if integers)
+        :param capacity: normalized capacity
+        :return: 'capacity' or 'value'
+        """
+        if self.indexing != 'auto':
+            return self.indexing
+        if self.stats.get('dp_reduction_skipped'):
+            return 'capacity'  # the table is kept for re-solves
+        if self.reconstruction == 'hirschberg' or values.dtype != np.int64:
+            return 'capacity'
+        return 'value' if int(values.sum()) < capacity else 'capacity'
+
+    def _solve(self):
+        items = self.ds.items
+        values = self.ds.value_array()
+        values = values.astype(_value_dtype(values))
+
+        scaled_values = values
+        if values.dtype == np.int64:  # values can be normalized by their GCD as well
+            divisor = reduce(math.gcd, (int(v) for v in values), 0) or 1
+            scaled_values = values // divisor
+
+        weights = self.ds.weight_array()
+        if _value_dtype(weights) == np.int64:
+            weights, capacity = self._normalize()
+            indexing = self._choose_indexing(scaled_values, capacity)
+        else:  # fractional weights cannot index the table, value indexing takes them as they are
+            if self.indexing == 'capacity':
+                raise ValueError("Capacity indexed DP requires integer weights!")
+            capacity = self.ds.capacity
+            indexing = 'value'
+        self.stats['dp_indexing'] = indexing
+
+        if indexing == 'value':
+            if values.dtype != np.int64:
+                raise ValueError("Value indexed DP requires integer values (or integer weights)!")
+            self.stats['dp_value_gcd'] = divisor
+            self.stats['dp_cells_after'] = self.ds.nitems * (int(scaled_values.sum()) + 1)
+            selected = _dp_min_weight(scaled_values, weights, capacity, self._report_rows)
+        elif self.reconstruction == 'hirschberg':
+            selected = []
+            _dp_hirschberg(values, weights, capacity, 0, len(values), selected)
+        else:
+            take, reused = self._take_table(values, weights, capacity)
+            selected = _dp_select(take, weights, capacity)
+            self.stats['dp_reused_items'] = reused
+
+        for m in sorted(selected, reverse=True):
+            item = items[m]
+            self.knapsack.append(item)
+            self.tvalue += item.value
+            self.tweight += item.weight
+
+
+class SolverDynamicRecurrent(SolverDynamicBase):
     """
     Solver class for Dynamic programming using recurrent formula
     """
@@ -39,25 +496,28 @@ class SolverDynamicRecurrent(SolverBase):
         Recurrent Dynamic Programing (DP) solution algorithm of Knapsack problem
         :param lru_cache_maxsize: maximum number of entries store in cache (None = no limit)
         """
+        weights, capacity = self._normalize()
+        weights = weights.tolist()
+        values = self.ds.value_array().tolist()
+
         @lru_cache(maxsize=lru_cache_maxsize)
         def dp(m, n):
             "recurrent function for DP"
             if m == 0:
                 return 0
 
-            item = self.ds.items[m-1]
-            if item.weight <= n:
-                return max( dp(m-1, n) , item.value+ dp(m-1, n-item.weight) )
+            if weights[m-1] <= n:
+                return max( dp(m-1, n) , values[m-1]+ dp(m-1, n-weights[m-1]) )
             else:
                 return dp(m-1, n)
 
         #backward run
-        n = self.ds.capacity
+        n = capacity
 
         for m in range(self.ds.nitems, 0, -1):
             if dp(m, n) != dp(m-1, n):
                 item = self.ds.items[m-1]
-                n -= item.weight
+                n -= weights[m-1]
                 self.knapsack.append(item)
                 self.tvalue += item.value
                 self.tweight += item.weight
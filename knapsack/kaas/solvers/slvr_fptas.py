@@ -0,0 +1,51 @@
+import numpy as np
+
+from kaas.solvers.slvr_base import SolverBase
+from kaas.solvers.slvr_dp import _dp_min_weight
+
+
+class SolverFPTAS(SolverBase):
+    """
+    Solver class for Fully Polynomial Time Approximation Scheme
+     - values are scaled down by K = epsilon*max_value/nitems and the value indexed DP
+       is run on scaled values, the solution is guaranteed to be at least (1-epsilon) of the optimum
+       in O(nitems^3/epsilon) time whatever the capacity is and weights need not be integers
+    """
+    def __init__(self, *args, epsilon=0.1, **kwargs):
+        "this solver takes more inputs than the rest, we have to extend constructor"
+        super(self.__class__, self).__init__(*args, **kwargs)
+
+        if not 0. < epsilon < 1.:
+            raise ValueError("FPTAS epsilon must be in (0, 1)!")
+        self.epsilon = epsilon
+
+        if not self.ds.sorted:  # this solver requires sorted items for the reported bound
+            self.ds.set_sorted()
+
+    def _solve(self):
+        items = self.ds.items
+        values = self.ds.value_array().astype(np.float64)
+        weights = self.ds.weight_array().astype(np.float64)
+        fits = weights <= self.ds.capacity
+        max_value = values[fits].max() if fits.any() else 0.
+        if max_value <= 0:
+            return  # no item fitting in has any value
+
+        scale = self.epsilon * max_value / self.ds.nitems
+        if np.all(np.floor(values) == values):
+            scale = max(scale, 1.)  # integer values need no scaling up, K = 1 gives the exact optimum
+        selected = _dp_min_weight(np.floor(values / scale).astype(np.int64), weights, self.ds.capacity,
+                                  self._report_rows)
+
+        for m in sorted(selected):
+            item = items[m]
+            self.knapsack.append(item)
+            self.tvalue += item.value
+            self.tweight += item.weight
+
+        #the optimum is at most the fractional bound and at most tvalue/(1-epsilon)
+        upper_bound = min(self.ds.fractional_bound(0), self.tvalue / (1. - self.epsilon))
+        self.stats.update({'epsilon': self.epsilon,
+                           'value_scale': scale,
+                           'upper_bound': upper_bound,
+                           'gap': upper_bound - self.tvalue})
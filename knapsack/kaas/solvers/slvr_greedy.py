@@ -10,6 +10,7 @@ class SolverGreedy(SolverBase):
         super(self.__class__, self).__init__(*args, **kwargs)
 
         self.fract = fractional  # do we assume fractional Greegy? (good for relaxation in Branch and Bound)
+        self.selected = []  # positions of selected items in the datastore
 
         if not self.ds.sorted:  # this solver requires sorted items
             self.ds.set_sorted()
@@ -26,17 +27,21 @@ class SolverGreedy(SolverBase):
         """
         self.tweight = w_offset
         self.tvalue = v_offset
+        values = self.ds.value_array().tolist()
+        weights = self.ds.weight_array().tolist()
 
-        for item in self.ds.items[level:]:
-            if self.tweight + item.weight <= self.ds.capacity:
-                self.knapsack.append(item)
-                self.tweight += item.weight
-                self.tvalue += item.value
+        for k in range(level, len(values)):  # items are materialized only if selected
+            if self.tweight + weights[k] <= self.ds.capacity:
+                self.knapsack.append(self.ds.items[k])
+                self.selected.append(k)
+                self.tweight += weights[k]
+                self.tvalue += values[k]
 
             elif self.fract:  # we do fractional Greedy optimization
-                self.knapsack.append(item)
-                fraction = (self.ds.capacity - self.tweight)/item.weight
-                self.tvalue += fraction*item.value
+                self.knapsack.append(self.ds.items[k])
+                self.selected.append(k)
+                fraction = (self.ds.capacity - self.tweight)/weights[k]
+                self.tvalue += fraction*values[k]
                 self.tweight = self.ds.capacity
                 break
 
@@ -1,55 +1,425 @@
 from __future__ import absolute_import
-from celery import shared_task, Task
+from celery import shared_task, group, Task
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_process_shutdown
 from datetime import datetime, timezone
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+import math
+import threading
+import time
+import traceback
+import uuid
 
 from kaas.solvers.slvr_greedy import SolverGreedy
-from kaas.solvers.slvr_dp import SolverDynamic, SolverDynamicRecurrent
+from kaas.solvers.slvr_dp import SolverDynamic, SolverDynamicRecurrent, SolverDynamicNumpy, DPTableStore
 from kaas.solvers.slvr_bb import BranchAndBoundSolver
+from kaas.solvers.slvr_fptas import SolverFPTAS
 from kaas.solvers.datastore import Datastore
-from kaas.models import KnapsackTask
+from kaas.models import KnapsackTask, blob_field_values, bulk_update_values
+from kaas.auto import DP_CELL_SECONDS, BB_NODE_SECONDS, choose_solver, predict_bb_seconds
+from kaas.cache import get_result_cache, instance_hash
+from kaas.completion import publish_done
+from knapsack.celery import QUEUE_TIERS
 
 SOLVER_TYPES = {
     'GREEDY': {'class': SolverGreedy,
-               'requires_sorted': True},
+               'requires_sorted': True,
+               'cost': lambda n, c, kw: n * math.log2(n + 2)},
     'DYN_PROG': {'class': SolverDynamic,
-                 'requires_sorted': False},
+                 'requires_sorted': False,
+                 'cost': lambda n, c, kw: n * (c + 1)},
+    'DYN_PROG_NUMPY': {'class': SolverDynamicNumpy,
+                       'requires_sorted': False,
+                       'accepts_capacities': True,
+                       'keeps_table': True,
+                       'cost': lambda n, c, kw: n * (c + 1) / 16},  # a row is one vectorized operation
     'DYN_PROG_RECURRENT': {'class': SolverDynamicRecurrent,
-                     'requires_sorted': False},
+                     'requires_sorted': False,
+                     'cost': lambda n, c, kw: n * (c + 1)},
     'BRANCH_AND_BOUND': {'class': BranchAndBoundSolver,
-                         'requires_sorted': True}
+                         'requires_sorted': True,
+                         'accepts_incumbent': True,
+                         #exponential worst case, tasks are routed by the run time predicted by kaas.auto instead
+                         'cost': lambda n, c, kw: n * min(2 ** min(n, 20), kw.get('max_nodes') or 2 ** 20)},
+    'FPTAS': {'class': SolverFPTAS,
+              'requires_sorted': True,
+              'cost': lambda n, c, kw: n ** 3 / kw.get('epsilon', 0.1)},
+    'AUTO': {'class': None,  # replaced by the engine chosen by cost model (see kaas.auto) on submission
+             'requires_sorted': False,
+             'accepts_capacities': True,
+             'auto': True}
 }
 
 SOLVER_DEFAULT = 'BRANCH_AND_BOUND'  # default solver if not provided
 
+SOLVER_INIT_DEFAULTS = {'reduce': True}  # every solver reduces the problem first unless told otherwise
 
-def task_driver(data, user):
+COLUMNAR_MIN_ITEMS = 10000  # from this many items on, datastore keeps items in numpy arrays instead of objects
+
+AUTO_OPTIONS = ('epsilon', 'reduce')  # init_kwargs accepted by AUTO, epsilon allows an approximate engine
+
+RESULT_BUFFER_DEFAULTS = {
+    'SIZE': 0,  # results of finished tasks buffered by a worker process before a bulk update, 0 saves at once
+    'INTERVAL': 1.,  # seconds, the buffer is flushed at latest this long after the first result buffered
+}
+
+DP_TABLES_DEFAULTS = {
+    'LOCATION': None,  # directory of DP tables kept for re-solves, None is a directory in system temp of each host
+    'MAX_BYTES': 2**30,  # total size of kept tables, the least recently used are removed
+    'MAX_TABLE_BYTES': 64 * 2**20,  # larger tables are not kept, 0 keeps none
+}
+
+PROGRESS_SAVE_INTERVAL = 10.  # seconds between saves of solver progress and best-so-far solution to the task row
+
+MICRO_BATCH_MAX_ITEMS = 30  # batches of instances with fewer items are solved many in one celery task...
+MICRO_BATCH_MAX_COST = 10**4  # ...unless their estimated cost is higher (see estimate_cost)
+MICRO_BATCH_SIZE = 200  # maximum number of instances solved by one such task
+MICRO_BATCH_BUFFER = {'SIZE': 50, 'INTERVAL': 1.}  # its results are saved in bulk as it runs, see ResultBuffer
+
+COST_PER_SECOND = 1 / (16 * DP_CELL_SECONDS)  # cost units (see DYN_PROG_NUMPY) per second predicted by kaas.auto
+
+
+def estimate_cost(solver_type, nitems, capacity, init_kwargs={}, seconds=None):
     """
-    Driver prepares task to be run and created a KnapsackTask object which will be later updated on its result
+    Rough estimate of number of elementary operations of a solver run, used to route the task to a queue tier
+    :param solver_type: string identifier of solver type
+    :param nitems: number of items
+    :param capacity: knapsack capacity
+    :param init_kwargs: solver options
+    :param seconds: run time predicted by the cost model (kaas.auto), replaces the rough estimate if given
+    :return: estimated cost
+    """
+    if seconds is not None:
+        return seconds * COST_PER_SECOND
+    if init_kwargs.get('capacities'):  # capacity sweep runs over the largest capacity
+        capacity = max([capacity] + list(init_kwargs['capacities']))
+    return SOLVER_TYPES[solver_type]['cost'](nitems, capacity, init_kwargs)
+
+
+def queue_options(cost):
+    """
+    Celery options (queue and time limits) of the cheapest queue tier allowing tasks of given cost
+    :param cost: estimated cost of the task, see estimate_cost()
+    :return: dict to be passed to apply_async() or set() of a signature
+    """
+    tier = next((tier for tier in QUEUE_TIERS if tier['max_cost'] is None or cost <= tier['max_cost']),
+                QUEUE_TIERS[-1])
+    return {'queue': tier['queue'], 'soft_time_limit': tier['soft_time_limit'], 'time_limit': tier['time_limit']}
+
+
+def _choose_engine(knapsack_data, init_kwargs):
+    """
+    Chooses solver of AUTO task by the cost model
+    :param knapsack_data: json with knapsack data
+    :param init_kwargs: options of AUTO task, see AUTO_OPTIONS
+    :return: solver type, predicted run time in seconds and init_kwargs for the solver
+    """
+    ds = Datastore(columnar=True)
+    ds.load_from_json(knapsack_data)
+    solver_type, predicted_cost, features = choose_solver(ds, init_kwargs.get('epsilon'),
+                                                          init_kwargs.get('capacities'))
+    if solver_type != 'FPTAS':  # exact engines take no epsilon
+        init_kwargs = {k: v for k, v in init_kwargs.items() if k != 'epsilon'}
+    if solver_type == 'DYN_PROG_NUMPY' and not features['integer_weights']:
+        init_kwargs = dict(init_kwargs, indexing='value')  # the cost model sized the table by values
+    return solver_type, predicted_cost, init_kwargs
+
+
+def _predict_bb_seconds(knapsack_data, init_kwargs):
+    """
+    Run time of B&B predicted by the cost model (kaas.auto) from a sample of items, bounded by its node
+    and time budgets
+    :param knapsack_data: json with knapsack data
+    :param init_kwargs: B&B options
+    :return: predicted seconds
+    """
+    seconds = predict_bb_seconds(knapsack_data)
+    if init_kwargs.get('max_nodes'):
+        seconds = min(seconds, init_kwargs['max_nodes'] * BB_NODE_SECONDS)
+    if init_kwargs.get('time_limit'):
+        seconds = min(seconds, init_kwargs['time_limit'])
+    return seconds
+
+
+def _create_task(data, user, batch_id=None):
+    """
+    Creates KnapsackTask object (not saved yet) for the given task json, if the same instance
+    has been solved before, the task is filled in from the result cache already finished
     :param data: Input data in json
     :param user: Djnago User instance of task owner
-    :return: celery task result
+    :param batch_id: id of batch the task is submitted in, if any
+    :return: KnapsackTask, solver type, knapsack data and solver options to be passed to solve_knapsack
     """
     solver_type = data.get('solver_type', SOLVER_DEFAULT)  # we have a default solver if not provided
     knapsack_data = data.get('knapsack_data')
+    init_kwargs = data.get('init_kwargs', {})  # solver options, e.g. {"reconstruction": "hirschberg"}
+    if 'capacities' in knapsack_data:  # capacity sweep, all capacities are solved by one solver run
+        init_kwargs = dict(init_kwargs, capacities=knapsack_data['capacities'])
+    task_hash = instance_hash(solver_type, knapsack_data, init_kwargs)
+
+    #the same instance solved before? then we answer at once, without the broker (and the cost model)
+    cache = get_result_cache()
+    cached = cache.get(task_hash) if cache is not None else None
+
+    #AUTO task is solved by the engine with the lowest predicted run time
+    solver_engine, predicted_cost = solver_type, None
+    if cached is not None:
+        solver_engine = cached.get('solver_engine', solver_type)
+    elif SOLVER_TYPES[solver_type].get('auto'):
+        solver_engine, predicted_cost, init_kwargs = _choose_engine(knapsack_data, init_kwargs)
+    elif solver_type == 'BRANCH_AND_BOUND':  # B&B may take exponential time, the cost model tells when
+        predicted_cost = _predict_bb_seconds(knapsack_data, init_kwargs)
+
     #we created a new task in database, in task we will update it on result
     kt = KnapsackTask(
             user=user,
             solver_type=solver_type,
-            input=knapsack_data['items'],
+            solver_engine=solver_engine,
+            predicted_cost=predicted_cost,
             capacity=knapsack_data['capacity'],
             nitems=knapsack_data['num_items'],
+            instance_hash=task_hash,
+            batch_id=batch_id,
     )
+    kt.set_blob_field('input', knapsack_data['items'])
+
+    #solution of a previous task (typically of the same instance with a few changes) as a warm start
+    if data.get('parent_task_id'):
+        kt.parent_task = KnapsackTask.objects.filter(id=data['parent_task_id'], user=user, status='SUCCESS').first()
+        if kt.parent_task is None or cached is not None:
+            pass  # nothing to start from or nothing to solve
+        elif SOLVER_TYPES[solver_engine].get('accepts_incumbent'):
+            init_kwargs = dict(init_kwargs, incumbent=[item['index'] for item in
+                                                                     kt.parent_task.get_blob_field('result_items')])
+        elif SOLVER_TYPES[solver_engine].get('keeps_table') and \
+                SOLVER_TYPES[kt.parent_task.solver_engine or kt.parent_task.solver_type].get('keeps_table'):
+            init_kwargs = dict(init_kwargs, parent_table=str(kt.parent_task.id))  # see _dp_table_store
+
+    if cached is not None:
+        now = datetime.now(timezone.utc)
+        kt.status = 'SUCCESS'
+        kt.done = True
+        kt.cache_hit = True
+        kt.result_value = cached['result_value']
+        kt.result_weight = cached['result_weight']
+        kt.set_blob_field('result_items', cached['result_items'])
+        kt.result_info = cached['result_info']
+        kt.task_solve_start = now
+        kt.task_solve_end = now
+
+    return kt, solver_engine, knapsack_data, init_kwargs
+
+
+def task_driver(data, user):
+    """
+    Driver prepares task to be run and created a KnapsackTask object which will be later updated on its result
+    :param data: Input data in json
+    :param user: Djnago User instance of task owner
+    :return: celery task result, None if the result was served from cache
+    """
+    kt, solver_type, knapsack_data, init_kwargs = _create_task(data, user)
+    if not kt.cache_hit:
+        kt.celery_task_id = str(uuid.uuid4())  # known before dispatch, so clients can wait for it at once
     kt.save()
+    if kt.cache_hit:
+        publish_done([kt.id])
+        return kt.id, None
 
-    #call of celery task
-    result = solve_knapsack.delay(solver_type, knapsack_data, kt.id, init_kwargs={}, solve_kwargs={})
+    #call of celery task, in a queue matching its size
+    cost = estimate_cost(solver_type, kt.nitems, kt.capacity, init_kwargs, kt.predicted_cost)
+    result = solve_knapsack.apply_async((solver_type, knapsack_data, kt.id),
+                                        {'init_kwargs': init_kwargs, 'solve_kwargs': {},
+                                         'instance_hash': kt.instance_hash,
+                                         'task_created': kt.task_created.isoformat()},
+                                        task_id=kt.celery_task_id, **queue_options(cost))
 
     return kt.id, result
 
 
+def batch_driver(data_list, user):
+    """
+    Driver of batch submission - all KnapsackTask objects are inserted at once by bulk_create
+    and the tasks are sent to the broker as a single celery group
+    :param data_list: list of input data in json
+    :param user: Djnago User instance of tasks owner
+    :return: batch id, list of task ids (in order of data_list) and celery group result (None if all cached)
+    """
+    batch_id = uuid.uuid4()
+    tasks = [_create_task(data, user, batch_id) for data in data_list]
+
+    #tiny instances would spend most of the time in celery overhead, they are solved in micro batches
+    #celery task ids are known before dispatch, so clients can wait for them at once
+    single, small = [], []
+    for kt, solver_type, knapsack_data, init_kwargs in tasks:
+        if kt.cache_hit:
+            continue
+        cost = estimate_cost(solver_type, kt.nitems, kt.capacity, init_kwargs, kt.predicted_cost)
+        if kt.nitems < MICRO_BATCH_MAX_ITEMS and cost <= MICRO_BATCH_MAX_COST:
+            small.append((kt, solver_type, knapsack_data, init_kwargs, cost))
+        else:
+            kt.celery_task_id = str(uuid.uuid4())
+            single.append((kt, solver_type, knapsack_data, init_kwargs, cost))
+    chunks = [small[start:start+MICRO_BATCH_SIZE] for start in range(0, len(small), MICRO_BATCH_SIZE)]
+    for chunk in chunks:
+        celery_task_id = str(uuid.uuid4())
+        for job in chunk:
+            job[0].celery_task_id = celery_task_id
+
+    with transaction.atomic():  # the whole batch or nothing
+        KnapsackTask.objects.bulk_create([kt for kt, _, _, _ in tasks])
+    publish_done([kt.id for kt, _, _, _ in tasks if kt.cache_hit])
+
+    #signatures carry task_created, which is set by the insert
+    signatures = [solve_knapsack.s(solver_type, knapsack_data, kt.id, init_kwargs=init_kwargs, solve_kwargs={},
+                                   instance_hash=kt.instance_hash, task_created=kt.task_created.isoformat())
+                  .set(task_id=kt.celery_task_id, **queue_options(cost))
+                  for kt, solver_type, knapsack_data, init_kwargs, cost in single]
+    signatures.extend(solve_knapsack_batch.s([(solver_type, knapsack_data, kt.id, init_kwargs, kt.instance_hash,
+                                               kt.task_created.isoformat())
+                                              for kt, solver_type, knapsack_data, init_kwargs, _ in chunk])
+                      .set(task_id=chunk[0][0].celery_task_id, **queue_options(sum(job[4] for job in chunk)))
+                      for chunk in chunks)
+    result = group(signatures).apply_async() if signatures else None
+
+    return batch_id, [kt.id for kt, _, _, _ in tasks], result
+
+
+def _total_duration(kwargs, end):
+    """
+    Value of task_total_duration computed from task_created passed to the celery task (isoformat),
+    so that the row need not be read (datetime arithmetic in SQLite loses some values)
+    :param kwargs: keyword arguments of solve_knapsack
+    :param end: end of the task
+    :return: dict with task_total_duration, empty if task_created is unknown (tasks sent by older code)
+    """
+    created = parse_datetime(kwargs.get('task_created') or '')
+    return {'task_total_duration': end - created} if created is not None else {}
+
+
+class ResultBuffer(object):
+    """
+    Buffer of result updates of tasks finished by a worker process, they are saved by bulk update
+    when there are settings.KAAS_RESULT_BUFFER['SIZE'] of them or 'INTERVAL' seconds after the first one,
+    clients waiting for the tasks are signalled once they are saved (see kaas.completion)
+    """
+    def __init__(self, config=None):
+        """
+        :param config: dict with 'SIZE' and 'INTERVAL' used instead of settings.KAAS_RESULT_BUFFER
+        """
+        self.config = config
+        self.updates = []  # (task id, dict of field values)
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def add(self, kt_id, values):
+        """
+        Saves values of task - at once if buffering is off
+        :param kt_id: id of KnapsackTask
+        :param values: dict of field name -> value or query expression
+        """
+        config = dict(RESULT_BUFFER_DEFAULTS, **(self.config or getattr(settings, 'KAAS_RESULT_BUFFER', {})))
+        if config['SIZE'] <= 1:
+            KnapsackTask.objects.filter(id=kt_id).update(**values)
+            publish_done([kt_id])
+            return
+        with self.lock:
+            self.updates.append((kt_id, values))
+            full = len(self.updates) >= config['SIZE']
+            if not full and self.timer is None:
+                self.timer = threading.Timer(config['INTERVAL'], self.flush, kwargs={'close_connection': True})
+                self.timer.daemon = True
+                self.timer.start()
+        if full:
+            self.flush()
+
+    def flush(self, close_connection=False):
+        """
+        Saves all buffered updates
+        :param close_connection: close database connection of the calling thread afterwards (timer thread)
+        """
+        with self.lock:
+            updates, self.updates = self.updates, []
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        try:
+            if updates:
+                bulk_update_values(KnapsackTask, updates)
+                publish_done([kt_id for kt_id, _ in updates])
+        finally:
+            if close_connection:
+                connection.close()
+
+
+_result_buffer = ResultBuffer()
+
+
+@worker_process_shutdown.connect
+def flush_result_buffer(**kwargs):
+    "nothing buffered is lost when worker process exits"
+    _result_buffer.flush()
+
+
+def _failure_values(celery_task_id, exc, exc_traceback, kwargs):
+    """
+    Values of failed task to be saved to its row
+    :param exc_traceback: formatted traceback of the exception
+    :param kwargs: keyword arguments of solve_knapsack
+    """
+    values = {
+        'celery_task_id': celery_task_id,
+        'status': 'FAILURE',
+        'done': True,
+        'exception_class': exc.__class__.__name__,
+        'exception_msg': str(exc).strip(),
+        'exception_traceback': exc_traceback.strip(),
+    }
+    values.update(_total_duration(kwargs, datetime.now(timezone.utc)))  # just approximate - time to failure:)
+    return values
+
+
+def _success_values(celery_task_id, retval, kwargs):
+    """
+    Values of solved task to be saved to its row
+    :param retval: return value of solve_knapsack
+    :param kwargs: keyword arguments of solve_knapsack
+    """
+    value, weight, items, solution_start, solution_end, stats = retval
+    values = {
+        'celery_task_id': celery_task_id,
+        'status': 'SUCCESS',
+        'done': True,
+        'result_value': value,
+        'result_weight': weight,
+        'result_info': stats,
+        'task_solve_start': solution_start,
+        'task_solve_end': solution_end,
+        'task_solution_duration': solution_end - solution_start,
+    }
+    values.update(_total_duration(kwargs, solution_end))
+    values.update(blob_field_values('result_items', items))
+    return values
+
+
+def _cache_result(solver_type, retval, kwargs):
+    "identical tasks submitted later are answered from cache"
+    cache = get_result_cache()
+    if cache is not None and kwargs.get('instance_hash'):
+        value, weight, items, _, _, stats = retval
+        cache.set(kwargs['instance_hash'], {'solver_engine': solver_type,
+                                            'result_value': value,
+                                            'result_weight': weight,
+                                            'result_items': items,
+                                            'result_info': stats})
+
+
 class LogTaskResult(Task):
     """
     Class implementing callbacks (mainly results persisting) for our celery task
+     - results are saved by a single UPDATE of result and status columns (possibly buffered, see ResultBuffer),
+       the row is never read (task_created comes with the task arguments)
     """
     def on_failure(self, exc, celery_task_id, args, kwargs, einfo):
         """
@@ -61,68 +431,106 @@ class LogTaskResult(Task):
         :param einfo: ExceptionInfo instance, containing the traceback.
         :return:
         """
-        kt_id = args[2]
         #update on FAILURE status
-        kt = KnapsackTask.objects.get(id=kt_id)
-        kt.celery_task_id = celery_task_id
-        kt.status = 'FAILURE'
-        kt.done = True
-        kt.exception_class = exc.__class__.__name__
-        kt.exception_msg = str(exc).strip()
-        kt.exception_traceback = str(einfo).strip()
-        kt.task_total_duration = datetime.now(timezone.utc) - kt.task_created  # just approximate value - time to failure:)
-        kt.save()
-
+        _result_buffer.add(args[2], _failure_values(celery_task_id, exc, str(einfo), kwargs))
 
     def on_success(self, retval, celery_task_id, args, kwargs):
         """
         What to do on celery task success
-        :param retval: The return value of the task (v, w, its['items'], solution_start, solution_end).
+        :param retval: The return value of the task (v, w, its['items'], solution_start, solution_end, stats).
         :param task_id: Unique id of the executed task.
         :param args: Original arguments for the executed task.
         :param kwargs: Original keyword arguments for the executed task.
         :return:
         """
-        kt_id = args[2]
         #update in SUCCESS status
-        kt = KnapsackTask.objects.get(id=kt_id)
-        kt.celery_task_id = celery_task_id
-        kt.status = 'SUCCESS'
-        kt.done = True
-        kt.result_value = retval[0]
-        kt.result_weight = retval[1]
-        kt.result_items = retval[2]
-        kt.task_solve_start = retval[3]
-        kt.task_solve_end = retval[4]
-        kt.task_solution_duration = retval[4] - retval[3]
-        kt.task_total_duration = retval[4] - kt.task_created
-        kt.save()
+        _result_buffer.add(args[2], _success_values(celery_task_id, retval, kwargs))
+        _cache_result(args[0], retval, kwargs)
+
+
+_dp_tables = (None, None)  # (configuration, store instance)
+
+
+def _dp_table_store():
+    """
+    Store of DP tables configured by settings.KAAS_DP_TABLES (see DP_TABLES_DEFAULTS), every task
+    keeps its table there under its id and a task with parent_task_id resumes from the parent's table
+    :return: DPTableStore or None if no tables are kept
+    """
+    global _dp_tables
+    config = dict(DP_TABLES_DEFAULTS, **getattr(settings, 'KAAS_DP_TABLES', {}))
+    if _dp_tables[0] != config:
+        store = DPTableStore(config['LOCATION'], config['MAX_BYTES'], config['MAX_TABLE_BYTES']) \
+            if config['MAX_TABLE_BYTES'] else None
+        _dp_tables = (config, store)
+    return _dp_tables[1]
+
+
+def _build_solver(solver_type, knapsack_data, init_kwargs):
+    """
+    Loads knapsack data into a datastore and constructs solver of the given type over it
+    :return: solver ready to run
+    """
+    #construction of datastore
+    #requires this solver sorted items by their value density?
+    requires_sorted = SOLVER_TYPES[solver_type]['requires_sorted']
+    #instantiate a datastore
+    ds = Datastore(sorted=requires_sorted, columnar=len(knapsack_data['items']) >= COLUMNAR_MIN_ITEMS)
+    ds.load_from_json(knapsack_data)
+
+    #construction of solver
+    solver_class = SOLVER_TYPES[solver_type]['class']
+    return solver_class(ds, **dict(SOLVER_INIT_DEFAULTS, **init_kwargs))
+
+
+class SolveProgress(object):
+    """
+    Progress callback of solver (see SolverBase._report_progress) - every report goes to meta of celery
+    task state, the task row gets the progress and best-so-far items every PROGRESS_SAVE_INTERVAL seconds
+    """
+    def __init__(self, task, kt_id):
+        self.task = task
+        self.kt_id = kt_id
+        self.saved_time = time.monotonic()
+        self.saved_value = None  # incumbent value in the task row
+
+    def __call__(self, info):
+        items = info.pop('incumbent_items', None)
+        self.task.update_state(state='SOLVING', meta=info)
+
+        now = time.monotonic()
+        if now - self.saved_time < PROGRESS_SAVE_INTERVAL:
+            return
+        values = {'progress': info}
+        if items is not None and info['incumbent_value'] != self.saved_value:  # items only if improved
+            values['incumbent_value'] = self.saved_value = info['incumbent_value']
+            values.update(blob_field_values('incumbent_items', items))
+        KnapsackTask.objects.filter(id=self.kt_id, done=False).update(**values)
+        self.saved_time = now
 
 
 @shared_task(base=LogTaskResult, bind=True, name='Knapsack problem', queue="knapsack_solvers")
-def solve_knapsack(self, solver_type, knapsack_data, kt_id, init_kwargs={}, solve_kwargs={}):
+def solve_knapsack(self, solver_type, knapsack_data, kt_id, init_kwargs={}, solve_kwargs={}, instance_hash='',
+                   task_created=''):
     """
     Celery task to solve Knapsack problem
     :param solver_type: string identified of solver type
     :param knapsack_data: json with knapsack data, described in Datastore class
     :param kt_id: id of KnapsackTask in database
     :param init_kwargs:  additional params that can be passed to solver constructor, e.g. fractional option
+                        or DP reconstruction
     :param solve_kwargs: additinoal params that can be passed to solve() method, e.g. offsets
-    :return: total value and weight of knapsack items
+    :param instance_hash: canonical hash of the task, the result is cached under it (see kaas.cache)
+    :param task_created: creation time of KnapsackTask (isoformat), task_total_duration is computed from it
+    :return: total value and weight of knapsack items, selected items, solution start and end and solver stats
     """
     solution_start = datetime.now(timezone.utc)
     self.update_state(state='INITIALIZING')
 
-    #construction of datastore
-    #requires this solver sorted items by their value density?
-    requires_sorted = SOLVER_TYPES[solver_type]['requires_sorted']
-    #instantiate a datastore
-    ds = Datastore(sorted=requires_sorted)
-    ds.load_from_json(knapsack_data)
-
-    #construction of solver
-    solver_class = SOLVER_TYPES[solver_type]['class']
-    solver = solver_class(ds, **init_kwargs)
+    solver = _build_solver(solver_type, knapsack_data, init_kwargs)
+    solver.progress = SolveProgress(self, kt_id)
+    if SOLVER_TYPES[solver_type].get('keeps_table'):
+        solver.table_store, solver.table_key = _dp_table_store(), str(kt_id)
 
     self.update_state(state='SOLVING')
 
@@ -131,5 +539,58 @@ def solve_knapsack(self, solver_type, knapsack_data, kt_id, init_kwargs={}, solv
     w = solver.tweight
     its = solver.get_item_json()
     solution_end = datetime.now(timezone.utc)
-    return v, w, its['items'], solution_start, solution_end
+    return v, w, its['items'], solution_start, solution_end, solver.stats
+
+
+class LogBatchResult(Task):
+    """
+    Class implementing failure callback of micro batch task, results are persisted by the task itself
+    """
+    def on_failure(self, exc, celery_task_id, args, kwargs, einfo):
+        """
+        The batch failed as a whole (e.g. on time limit or database error), its unfinished tasks fail
+        :param args: Original arguments for the task that failed, i.e. list of jobs.
+        """
+        KnapsackTask.objects.filter(id__in=[job[2] for job in args[0]], done=False).update(
+            celery_task_id=celery_task_id,
+            status='FAILURE',
+            done=True,
+            exception_class=exc.__class__.__name__,
+            exception_msg=str(exc).strip(),
+            exception_traceback=str(einfo).strip())
+        publish_done([job[2] for job in args[0]])
+
 
+@shared_task(base=LogBatchResult, bind=True, name='Knapsack problem batch', queue="knapsack_solvers")
+def solve_knapsack_batch(self, jobs):
+    """
+    Celery task to solve many small Knapsack problems at once - there are no state updates and results
+    are saved by bulk updates as the batch runs (see MICRO_BATCH_BUFFER), so the celery and database overhead
+    is paid once per many tasks instead of per task. On time limit, results solved so far are saved
+    and the rest of the batch fails.
+    :param jobs: list of (solver_type, knapsack_data, kt_id, init_kwargs, instance_hash, task_created),
+                 see solve_knapsack
+    :return: number of successfully solved tasks
+    """
+    buffer = ResultBuffer(MICRO_BATCH_BUFFER)
+    solved = 0
+    try:
+        for solver_type, knapsack_data, kt_id, init_kwargs, instance_hash, task_created in jobs:
+            kwargs = {'instance_hash': instance_hash, 'task_created': task_created}
+            solution_start = datetime.now(timezone.utc)
+            try:
+                solver = _build_solver(solver_type, knapsack_data, init_kwargs)
+                solver.run()
+            except SoftTimeLimitExceeded:
+                raise  # not a failure of this task only, see LogBatchResult
+            except Exception as exc:
+                buffer.add(kt_id, _failure_values(self.request.id, exc, traceback.format_exc(), kwargs))
+                continue
+            retval = (solver.tvalue, solver.tweight, solver.get_item_json()['items'], solution_start,
+                      datetime.now(timezone.utc), solver.stats)
+            buffer.add(kt_id, _success_values(self.request.id, retval, kwargs))
+            _cache_result(solver_type, retval, kwargs)
+            solved += 1
+    finally:
+        buffer.flush()
+    return solved
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 import os
 from celery import Celery
+from celery.signals import celeryd_init
 from kombu import Queue
 
 # set the default Django settings module for the 'celery' program.
@@ -14,6 +15,21 @@ app = Celery('knapsack',
 app.conf.update(result_expires=3600)
 #app.conf.task_routes = {'tasks.solve_knapsack': {'queue': 'knapsack_solvers'}}
 
+#tiers of queues, cheapest first - a task goes to the first tier whose max_cost is not exceeded
+#by its estimated cost (see kaas.tasks.estimate_cost), so heavy tasks do not block the small interactive ones
+#time limits (seconds) are applied to every task sent to the tier, concurrency and prefetch to workers
+#started for the tier only, e.g. celery worker -A knapsack -Q knapsack_interactive
+QUEUE_TIERS = [
+    {'queue': 'knapsack_interactive', 'max_cost': 10**6,
+     'concurrency': 8, 'prefetch_multiplier': 4, 'soft_time_limit': 10, 'time_limit': 20},
+    {'queue': 'knapsack_solvers', 'max_cost': 10**9,
+     'concurrency': 4, 'prefetch_multiplier': 1, 'soft_time_limit': 600, 'time_limit': 660},
+    {'queue': 'knapsack_heavy', 'max_cost': None,
+     'concurrency': 1, 'prefetch_multiplier': 1, 'soft_time_limit': 6 * 3600, 'time_limit': 6 * 3600 + 60},
+]
+
+app.conf.update(task_queues=[Queue(tier['queue']) for tier in QUEUE_TIERS])
+
 
 # Using a string here means the worker don't have to serialize
 # the configuration object to child processes.
@@ -27,4 +43,20 @@ app.autodiscover_tasks()
 
 @app.task(bind=True)
 def debug_task(self):
-    print('Request: {0!r}'.format(self.request))
\ No newline at end of file
+    print('Request: {0!r}'.format(self.request))
+
+
+@celeryd_init.connect
+def configure_tier_worker(sender=None, conf=None, options=None, **kwargs):
+    """
+    Worker consuming a single tier gets the concurrency and prefetch of that tier,
+    explicit command line options (-c, --prefetch-multiplier) still take precedence
+    """
+    queues = (options or {}).get('queues') or []
+    if isinstance(queues, str):
+        queues = queues.split(',')
+    tiers = [tier for tier in QUEUE_TIERS if tier['queue'] in queues]
+    if len(tiers) != 1:  # worker serving more tiers keeps its own configuration
+        return
+    conf.update(worker_concurrency=tiers[0]['concurrency'],
+                worker_prefetch_multiplier=tiers[0]['prefetch_multiplier'])
@@ -138,6 +138,26 @@ FIXTURE_DIRS = (
 #celery stuff
 CELERY_IGNORE_RESULT = False
 
+#cache of solved instances, identical tasks are answered at submission (see kaas/cache.py)
+#results computed by workers reach the web process only through a shared backend:
+#'disk' with 'LOCATION' on a filesystem common to web and workers or 'django' with memcached/redis in CACHES
+#(default CACHES of django is local memory of each process)
+KAAS_RESULT_CACHE = {
+    'BACKEND': 'disk',
+    'LOCATION': os.path.join(BASE_DIR, 'result_cache'),
+    'TTL': 24 * 3600,
+}
+
+#large task inputs and results are stored compressed out of task rows (see kaas/blobs.py)
+#'database' keeps them in a side table, 'filesystem' in 'LOCATION' directory shared by web and workers
+KAAS_BLOB_STORE = {
+    'BACKEND': 'database',
+    'MIN_SIZE': 64 * 1024,
+}
+
+#maximum seconds GET /api/v1/tasks/<id>/?wait=S blocks a web worker waiting for the task
+KAAS_MAX_WAIT = 30
+
 #fornt-end stuff
 from django.core.urlresolvers import reverse_lazy
 #which URL to redirect after login if the contrib.auth.views.login view gets no next parameter
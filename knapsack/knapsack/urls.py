@@ -28,7 +28,10 @@ urlpatterns = [
 
     #REST API
     url(r'^{}tasks/$'.format(API_PREFIX), endpoints.KnapsackTaskListAPI.as_view(), name='api_task_list'),
+    url(r'^{}tasks/batch/$'.format(API_PREFIX), endpoints.KnapsackTaskBatchAPI.as_view(), name='api_task_batch'),
+    url(r'^{}tasks/batch/(?P<batch_id>[-a-z0-9]+)/$'.format(API_PREFIX), endpoints.KnapsackTaskBatchDetailAPI.as_view(), name='api_task_batch_detail'),
     url(r'^{}tasks/(?P<task_id>[-a-z0-9]+)/$'.format(API_PREFIX), endpoints.KnapsackTaskDetailAPI.as_view(), name='api_task_detail'),
+    url(r'^{}tasks/(?P<task_id>[-a-z0-9]+)/(?P<field>input|result_items|incumbent_items)/$'.format(API_PREFIX), endpoints.KnapsackTaskBlobAPI.as_view(), name='api_task_blob'),
 
     #web views handlers
     url(r'^$', views.index),  # index page
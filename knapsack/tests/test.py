@@ -1,15 +1,30 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
 from rest_framework import status
+from datetime import timedelta
+import gzip
+import io
+import json
 import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
-from kaas.solvers.datastore import Datastore
+from kaas.solvers.datastore import Datastore, Item
+from kaas.solvers.json_stream import JSONStreamReader, iter_knapsack_items
 from kaas.solvers.slvr_greedy import SolverGreedy
-from kaas.solvers.slvr_dp import SolverDynamicRecurrent, SolverDynamic
+from kaas.solvers.slvr_dp import SolverDynamicRecurrent, SolverDynamic, SolverDynamicNumpy, DPTableStore
 from kaas.solvers.slvr_bb import BranchAndBoundSolver
-from kaas.models import KnapsackTask
+from kaas.solvers.slvr_fptas import SolverFPTAS
+from kaas.auto import choose_solver, instance_features, predict_costs, predict_bb_seconds
+from kaas.models import KnapsackTask, Blob
+from kaas.completion import TaskDoneSubscription, publish_done
+from knapsack import settings as project_settings
 
 THIS_MODULE_PATH = os.path.dirname(__file__)
 TEST_FILE_PATH = os.path.join(THIS_MODULE_PATH, "data", "ks_22.json")
@@ -38,6 +53,116 @@ class TestDatastore(TestCase):
         assert ds.items[ds.nitems-1].weight == 52
         assert ds.items[ds.nitems-1].density == 5/26
 
+    def test_datastore_load_json_stream(self):
+        "streamed loading of a task request, tiny chunks split items between reads"
+        sample_path = os.path.join(THIS_MODULE_PATH, "data", "sample_inputs", "ks_200.json")
+        with open(sample_path) as f:
+            data = json.load(f)['knapsack_data']
+
+        with open(sample_path) as f:
+            header = {}
+            items = list(iter_knapsack_items(JSONStreamReader(f, chunk_size=7), header))
+        assert items == data['items']
+        assert header['num_items'] == data['num_items']
+        assert header['capacity'] == data['capacity']
+
+        #chunk boundaries at every offset (shifted by leading spaces), also inside numbers
+        text = '{"capacity": 12.5, "num_items": 1, "items": [{"index": 0, "value": 1.25e3, "weight": 4}]}'
+        for shift in range(5):
+            header = {}
+            items = list(iter_knapsack_items(JSONStreamReader(io.StringIO(' ' * shift + text), chunk_size=5), header))
+            assert header == {'capacity': 12.5, 'num_items': 1}
+            assert items == [{'index': 0, 'value': 1250., 'weight': 4}]
+
+        for columnar in (False, True):
+            ds = Datastore(columnar=columnar)
+            ds.load_from_json_file(sample_path)
+            assert ds.nitems == 200
+            assert [(x.index, x.value, x.weight) for x in ds.items] == \
+                   [(x['index'], x['value'], x['weight']) for x in data['items']]
+
+            #num_items does not precede items
+            ds = Datastore(columnar=columnar)
+            ds.load_from_json_stream(io.StringIO('{"items": [{"index": 0, "value": 8, "weight": 4}], '
+                                                 '"capacity": 6, "num_items": 1}'))
+            assert ds.nitems == 1
+            assert ds.capacity == 6
+            assert ds.items[0].value == 8
+
+    def test_datastore_binary_file(self):
+        "json -> binary -> datastore roundtrip"
+        ds = Datastore()
+        ds.load_from_json_file(TEST_FILE_PATH)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            binary_path = os.path.join(tmp_dir, "ks_22.knb")
+            ds.save_to_binary_file(binary_path)
+
+            for columnar in (False, True):
+                ds_bin = Datastore(sorted=True, columnar=columnar)
+                ds_bin.load_from_binary_file(binary_path)
+                assert ds_bin.nitems == 22
+                assert ds_bin.capacity == 400
+                assert ds_bin.items[0].value == 150
+                assert ds_bin.items[0].weight == 9
+                solver = BranchAndBoundSolver(ds_bin)
+                solver.run()
+                assert solver.tvalue == 1030
+
+    def test_datastore_fractional_bound(self):
+        ds = Datastore(sorted=True)
+        ds.load_from_json_file(TEST_FILE_PATH)
+
+        #prefix sums of sorted items
+        assert len(ds.prefix_weight) == ds.nitems + 1
+        assert ds.prefix_weight[1] == 9
+        assert ds.prefix_value[1] == 150
+
+        #bound from the root equals fractional Greedy solution
+        sgreedy = SolverGreedy(ds, fractional=True)
+        sgreedy.run()
+        assert abs(ds.fractional_bound(0) - sgreedy.tvalue) < 1e-9
+
+        #bound of a node which already took the first item
+        sgreedy = SolverGreedy(ds, fractional=True)
+        sgreedy.run(level=1, w_offset=9, v_offset=150)
+        assert abs(ds.fractional_bound(1, 9, 150) - sgreedy.tvalue) < 1e-9
+
+
+    def test_datastore_reduce(self):
+        ds = Datastore(sorted=True)
+        ds.load_from_json_str('{"num_items": 5, "capacity": 10, "items": ['
+                              '{"index": 0, "value": 8, "weight": 4}, {"index": 1, "value": 8, "weight": 4},'
+                              '{"index": 2, "value": 8, "weight": 4}, {"index": 3, "value": 5, "weight": 0},'
+                              '{"index": 4, "value": 50, "weight": 11}]}')
+        stats = ds.reduce()
+
+        #item 4 never fits, item 3 is weightless, one of the three duplicates cannot fit in with the others
+        assert [x.index for x in ds.fixed_items] == [3]
+        assert stats['items_before'] == 5
+        assert stats['items_fixed_in'] == 1
+        assert stats['items_removed'] == 2
+        assert ds.nitems == 2
+        assert ds.capacity == 10
+
+    def test_datastore_reduce_fractional(self):
+        "items filling fractional capacity exactly are not dropped by rounding errors of the residual capacity"
+        data = ('{"num_items": 4, "capacity": 138.41, "items": ['
+                '{"index": 0, "value": 23, "weight": 54.77}, {"index": 1, "value": 52, "weight": 42.51},'
+                '{"index": 2, "value": 56, "weight": 41.13}, {"index": 3, "value": 20, "weight": 9.21}]}')
+        ds = Datastore(sorted=True)
+        ds.load_from_json_str(data)
+        stats = ds.reduce()
+        assert stats['items_fixed_in'] > 0
+        assert abs(ds.capacity + sum(x.weight for x in ds.fixed_items) - 138.41) < 1e-6
+
+        for solver_class in (SolverDynamicNumpy, BranchAndBoundSolver):
+            ds = Datastore(sorted=True)
+            ds.load_from_json_str(data)
+            solver = solver_class(ds, reduce=True)
+            solver.run()
+            assert solver.tvalue == 131  # items 0, 1 and 2 weigh 138.41 exactly
+        assert len(ds.prefix_weight) == 3
+
 
 class TestSolvers(TestCase):
     """
@@ -91,6 +216,91 @@ class TestSolvers(TestCase):
         assert sdpr.tweight == 396
         assert sdpr.tvalue == 1030
 
+    def test_numpy_dynamic_programming(self):
+        "test of NumPy vectorized dynamic programming solver"
+
+        sdpn = SolverDynamicNumpy(self.ds)
+
+        #test of correct initialization
+        assert sdpn.ds.nitems == 22
+
+        #test of solver
+        sdpn.run()
+        assert sdpn.tweight == 396
+        assert sdpn.tvalue == 1030
+        assert sdpn.get_total_weight() == 396
+        assert sdpn.get_total_value() == 1030
+
+    def test_numpy_dynamic_programming_hirschberg(self):
+        "test of NumPy dynamic programming solver with linear memory reconstruction"
+
+        sdpn = SolverDynamicNumpy(self.ds, reconstruction='hirschberg')
+        assert sdpn.reconstruction == 'hirschberg'
+
+        #test of solver
+        sdpn.run()
+        assert sdpn.tweight == 396
+        assert sdpn.tvalue == 1030
+        assert sdpn.get_total_weight() == 396
+        assert sdpn.get_total_value() == 1030
+
+    def test_numpy_dynamic_programming_value_indexed(self):
+        "test of NumPy dynamic programming solver indexed by value"
+
+        sdpn = SolverDynamicNumpy(self.ds, indexing='value')
+        sdpn.run()
+        assert sdpn.stats['dp_indexing'] == 'value'
+        assert sdpn.stats['dp_value_gcd'] == 1
+        assert sdpn.tweight == 396
+        assert sdpn.tvalue == 1030
+
+        #large capacity and small values - value indexing is picked automatically
+        self.ds.capacity = 400*10**6 + 22
+        for item in self.ds.items:
+            item.weight = item.weight * 10**6 + 1
+        sdpn = SolverDynamicNumpy(self.ds)
+        sdpn.run()
+        assert sdpn.stats['dp_indexing'] == 'value'
+        assert sdpn.tvalue == 1030
+
+    def test_dynamic_programming_gcd_scaling(self):
+        "test of weights and capacity normalization in DP solvers"
+
+        for item in self.ds.items:
+            item.weight *= 100
+        self.ds.capacity = 400*100 + 99
+
+        for solver_class in (SolverDynamic, SolverDynamicNumpy):
+            sdp = solver_class(self.ds)
+            sdp.run()
+            assert sdp.stats['dp_weight_gcd'] == 100
+            assert sdp.stats['dp_capacity'] == 400
+            assert sdp.stats['dp_cells_after'] == 22*401
+            assert sdp.tweight == 39600
+            assert sdp.tvalue == 1030
+
+    def test_dynamic_programming_float_weights(self):
+        "capacity indexed DP solvers refuse fractional weights instead of rounding them"
+
+        self.ds.load_from_json({'num_items': 3, 'capacity': 3, 'items': [
+            {'index': m, 'value': 10, 'weight': 1.5} for m in range(3)]})
+        for solver_class in (SolverDynamic, SolverDynamicRecurrent):
+            with self.assertRaises(ValueError):
+                solver_class(self.ds).run()
+
+        #NumPy DP indexes the table by values then, with exact weights
+        sdpn = SolverDynamicNumpy(self.ds)
+        sdpn.run()
+        assert sdpn.stats['dp_indexing'] == 'value'
+        assert sdpn.tvalue == 20
+        assert sdpn.tweight == 3
+        with self.assertRaises(ValueError):
+            SolverDynamicNumpy(self.ds, indexing='capacity').run()
+        for item in self.ds.items:
+            item.value = 10.5
+        with self.assertRaises(ValueError):
+            SolverDynamicNumpy(self.ds).run()
+
     def test_recurrent_dynamic_programming(self):
         "test of dynamic programming solver"
 
@@ -104,6 +314,19 @@ class TestSolvers(TestCase):
         assert sdpr.tweight == 396
         assert sdpr.tvalue == 1030
 
+    def test_fptas(self):
+        "test of FPTAS solver - solution is within (1-epsilon) of the optimum"
+
+        sfptas = SolverFPTAS(self.ds, epsilon=0.5)
+        assert sfptas.epsilon == 0.5
+
+        sfptas.run()
+        assert sfptas.tweight <= 400
+        assert sfptas.tvalue >= 0.5 * 1030
+        assert sfptas.get_total_value() == sfptas.tvalue
+        assert sfptas.stats['upper_bound'] >= 1030
+        assert sfptas.stats['upper_bound'] <= sfptas.tvalue / 0.5
+
     def test_branch_and_bound(self):
         "test of Branch&Bound implementation using fractional Greedy relaxation"
 
@@ -116,8 +339,264 @@ class TestSolvers(TestCase):
         sbb.run()
         assert sbb.tweight == 396
         assert sbb.tvalue == 1030
+        assert sbb.stats['optimal'] == True
+        assert sbb.stats['gap'] == 0
+
+    def test_solvers_with_reduction(self):
+        "test of all solvers on reduced problem"
+
+        for solver_class in (SolverDynamic, SolverDynamicNumpy, BranchAndBoundSolver):
+            ds = Datastore(sorted=True)
+            ds.load_from_json_file(TEST_FILE_PATH)
+            solver = solver_class(ds, reduce=True)
+            solver.run()
+            assert solver.stats['reduction']['items_before'] == 22
+            assert solver.tweight == 396
+            assert solver.tvalue == 1030
+            assert solver.get_total_value() == 1030
+
+    def test_columnar_datastore(self):
+        "test of all solvers on columnar datastore"
+
+        for solver_class in (SolverGreedy, SolverDynamic, SolverDynamicNumpy, SolverDynamicRecurrent,
+                             BranchAndBoundSolver, SolverFPTAS):
+            ds = Datastore(sorted=True, columnar=True)
+            ds.load_from_json_file(TEST_FILE_PATH)
+            assert ds.nitems == 22
+            assert isinstance(ds.items[0].index, int)
+            solver = solver_class(ds)
+            solver.run()
+            assert solver.tvalue == solver.get_total_value()
+            if solver_class in (SolverGreedy, SolverFPTAS):
+                assert solver.tweight <= 400
+            else:
+                assert solver.tweight == 396
+                assert solver.tvalue == 1030
+
+    def test_branch_and_bound_depth_first(self):
+        "test of depth-first Branch&Bound"
+
+        sbb = BranchAndBoundSolver(self.ds, search='depth_first')
+        sbb.run()
+        assert sbb.tweight == 396
+        assert sbb.tvalue == 1030
+        assert sbb.stats['optimal'] == True
 
+    def test_branch_and_bound_optimal(self):
+        "test of Branch&Bound against numpy DP on bundled samples, for all search strategies"
 
+        sample_path = os.path.join(THIS_MODULE_PATH, "data", "sample_inputs", "ks_{}.json")
+        for nitems in (4, 22, 30, 50, 400, 1000):
+            ds = Datastore(sorted=True, columnar=True)
+            ds.load_from_json_file(sample_path.format(nitems))
+            sdp = SolverDynamicNumpy(ds)
+            sdp.run()
+            for search in ('best_first', 'depth_first', 'hybrid'):
+                ds = Datastore(sorted=True, columnar=True)
+                ds.load_from_json_file(sample_path.format(nitems))
+                sbb = BranchAndBoundSolver(ds, search=search)
+                sbb.run()
+                assert sbb.stats['optimal'] == True, (nitems, search)
+                assert sbb.tvalue == sdp.tvalue, (nitems, search)
+                assert sbb.get_total_value() == sbb.tvalue
+                assert sbb.tweight <= ds.capacity
+
+    def test_branch_and_bound_budget(self):
+        "test of Branch&Bound stopped by node budget - Greedy warm-start is returned with the gap"
+
+        sbb = BranchAndBoundSolver(self.ds, search='hybrid', max_nodes=0)
+        sbb.run()
+        assert sbb.stats['nodes'] == 0
+        assert sbb.tvalue == 1030  # Greedy solution
+        assert sbb.stats['optimal'] == False
+        assert abs(sbb.stats['upper_bound'] - 1035.2173913043478) < 1e-9
+        assert abs(sbb.stats['gap'] - 5.2173913043478) < 1e-9
+
+    def test_branch_and_bound_budget_gap(self):
+        "test of Branch&Bound stopped by node and time budgets - the gap brackets the optimum"
+
+        sample_path = os.path.join(THIS_MODULE_PATH, "data", "sample_inputs", "ks_30.json")
+        optimum = 99798  # by DP, B&B needs ~6400 nodes to prove it
+        budgets = [{'max_nodes': max_nodes} for max_nodes in (1, 10, 100, 1000)] + [{'time_limit': 0}]
+        for search in ('best_first', 'depth_first', 'hybrid'):
+            for budget in budgets:
+                ds = Datastore(sorted=True, columnar=True)
+                ds.load_from_json_file(sample_path)
+                sbb = BranchAndBoundSolver(ds, search=search, **budget)
+                sbb.run()
+                if 'max_nodes' in budget:
+                    assert sbb.stats['nodes'] <= budget['max_nodes'], (search, budget)
+                assert sbb.stats['optimal'] == False, (search, budget)
+                assert sbb.tvalue <= optimum <= sbb.stats['upper_bound'] + 1e-9, (search, budget)
+                assert abs(sbb.stats['gap'] - (sbb.stats['upper_bound'] - sbb.tvalue)) < 1e-9
+                #items are rebuilt for the incumbent of a stopped search as well
+                assert sbb.get_total_value() == sbb.tvalue
+                assert sbb.tweight <= ds.capacity
+
+    def test_branch_and_bound_incumbent(self):
+        "test of Branch&Bound warm-started by a solution of a previous task"
+
+        def solver(capacity, **kwargs):
+            ds = Datastore(sorted=True)
+            ds.load_from_json_file(TEST_FILE_PATH)
+            ds.capacity = capacity
+            sbb = BranchAndBoundSolver(ds, **kwargs)
+            sbb.run()
+            return sbb
+
+        parent_items = [item.index for item in solver(450).knapsack]
+
+        #parent's solution beats Greedy (1072), it is returned even without any search
+        sbb = solver(450, incumbent=parent_items, max_nodes=0)
+        assert sbb.stats['warm_start'] == 'incumbent'
+        assert sbb.stats['nodes'] == 0
+        assert sbb.tvalue == 1075
+
+        #parent's solution no longer fits, Greedy is used
+        sbb = solver(400, incumbent=parent_items)
+        assert sbb.stats['warm_start'] == 'greedy'
+        assert sbb.tvalue == 1030
+
+    def test_numpy_dynamic_programming_capacity_sweep(self):
+        "test of DP solving several capacities in one pass"
+
+        ds = Datastore()
+        ds.load_from_json_file(TEST_FILE_PATH)
+        sdp = SolverDynamicNumpy(ds, capacities=[0, 100, 400, 1000])
+        sdp.run()
+        assert sdp.tvalue == 1030  # datastore capacity is solved as well
+        sweep = sdp.stats['capacities']
+        assert [result['capacity'] for result in sweep] == [0, 100, 400, 1000]
+        assert sweep[0]['value'] == 0
+        assert sweep[0]['items'] == []
+        assert sweep[2]['value'] == 1030
+        assert sweep[2]['weight'] == 396
+        assert sweep[3]['value'] == sum(item.value for item in ds.items)  # all fit in
+
+        ds100 = Datastore()
+        ds100.load_from_json_file(TEST_FILE_PATH)
+        ds100.capacity = 100
+        sdp100 = SolverDynamicNumpy(ds100)
+        sdp100.run()
+        assert sweep[1]['value'] == sdp100.tvalue
+        assert sweep[1]['weight'] <= 100
+
+    def test_numpy_dynamic_programming_prefix_reuse(self):
+        "test of DP re-solve resuming from the table of the parent solve kept in a table store"
+
+        with tempfile.TemporaryDirectory() as location:
+            store = DPTableStore(location)
+            ds = Datastore()
+            ds.load_from_json_file(TEST_FILE_PATH)
+            sdp = SolverDynamicNumpy(ds, reduce=True)
+            sdp.table_store, sdp.table_key = store, 'parent'
+            sdp.run()
+            assert sdp.stats['dp_reduction_skipped']  # reduced problems would not share leading items
+
+            #one more item at the end, all rows of the parent table are reused (in another process too)
+            ds = Datastore()
+            ds.load_from_json_file(TEST_FILE_PATH)
+            ds.items.append(Item(1, 1, 22))
+            ds.nitems += 1
+            sdp = SolverDynamicNumpy(ds, reduce=True, parent_table='parent')
+            sdp.table_store, sdp.table_key = DPTableStore(location), 'child'
+            sdp.run()
+            assert sdp.stats['dp_reused_items'] == 22
+            assert sdp.tvalue == 1031
+            assert sdp.tweight == 397
+
+            #unknown parent, the table is computed from scratch
+            sdp = SolverDynamicNumpy(ds, parent_table='unknown')
+            sdp.table_store = store
+            sdp.run()
+            assert sdp.stats['dp_reused_items'] == 0
+            assert sdp.tvalue == 1031
+
+            #tables over the size limit are not kept and the problem is reduced as usual
+            sdp = SolverDynamicNumpy(ds, reduce=True)
+            sdp.table_store, sdp.table_key = DPTableStore(location, max_table_bytes=0), 'large'
+            sdp.run()
+            assert 'dp_reduction_skipped' not in sdp.stats
+            assert store.load('large') is None
+            assert sdp.tvalue == 1031
+
+
+    def test_solver_progress(self):
+        "test of progress reported by solvers during the run"
+        reports = []
+        ds = Datastore(sorted=True)
+        ds.load_from_json_file(os.path.join(THIS_MODULE_PATH, "data", "sample_inputs", "ks_30.json"))
+        sbb = BranchAndBoundSolver(ds, search='depth_first')
+        sbb.progress = reports.append
+        sbb.progress_interval = 0.
+        sbb.run()
+        #time is checked once per 256 nodes
+        self.assertEqual(len(reports), sbb.stats['nodes'] // 256)
+        for report in reports:
+            self.assertTrue(report['incumbent_value'] <= sbb.tvalue <= report['upper_bound'])
+            self.assertEqual(report['gap'], report['upper_bound'] - report['incumbent_value'])
+            self.assertTrue(report['incumbent_weight'] <= ds.capacity)
+            self.assertEqual(sum(item['value'] for item in report['incumbent_items']), report['incumbent_value'])
+        self.assertEqual(reports[-1]['incumbent_value'], sbb.tvalue)
+
+        reports = []
+        sdp = SolverDynamicNumpy(self.ds, indexing='value')
+        sdp.progress = reports.append
+        sdp.progress_interval = 0.
+        sdp.run()
+        self.assertEqual([report['rows_done'] for report in reports], list(range(self.ds.nitems)))
+        self.assertEqual(reports[0]['rows_total'], self.ds.nitems)
+
+    def test_auto_solver_choice(self):
+        "test of solver choice of AUTO solver type by the cost model"
+        #DP table of test data is tiny
+        solver_type, cost, features = choose_solver(self.ds)
+        self.assertEqual(solver_type, 'DYN_PROG_NUMPY')
+        self.assertTrue(cost > 0)
+        #only numpy DP can run capacity sweep
+        self.assertEqual(choose_solver(self.ds, capacities=[100, 200])[0], 'DYN_PROG_NUMPY')
+
+        #uncorrelated data with large capacity - B&B explores just a few nodes
+        ds = Datastore()
+        ds.load_from_json({"num_items": 200, "capacity": 5 * 10**7, "items": [
+            {"index": i, "value": i * 7919 % 1000003, "weight": i * 104729 % 999983 + 1} for i in range(200)]})
+        self.assertEqual(choose_solver(ds)[0], 'BRANCH_AND_BOUND')
+
+        #strongly correlated data (value = weight + 10) are exponential for B&B
+        ds.load_from_json({"num_items": 60, "capacity": 1000, "items": [
+            {"index": i, "value": 7 * i % 97 + 11, "weight": 7 * i % 97 + 1} for i in range(60)]})
+        self.assertEqual(choose_solver(ds)[0], 'DYN_PROG_NUMPY')
+        #...and if values and weights are huge as well, an approximation is much cheaper
+        ds.load_from_json({"num_items": 60, "capacity": 10**9, "items": [
+            {"index": i, "value": (7 * i % 97 + 11) * 10**7 + i, "weight": (7 * i % 97 + 1) * 10**7 + i}
+            for i in range(60)]})
+        self.assertEqual(choose_solver(ds)[0], 'BRANCH_AND_BOUND')
+        self.assertEqual(choose_solver(ds, epsilon=0.1)[0], 'FPTAS')
+
+        #bundled samples: values proportional to weights with noise are easy for B&B even if highly correlated,
+        #values = weights + 1 are not
+        sample_path = os.path.join(THIS_MODULE_PATH, "data", "sample_inputs", "ks_{}.json")
+        for nitems, expected in ((200, 'DYN_PROG_NUMPY'), (400, 'BRANCH_AND_BOUND'), (10000, 'BRANCH_AND_BOUND')):
+            ds_sample = Datastore(columnar=True)
+            ds_sample.load_from_json_file(sample_path.format(nitems))
+            self.assertEqual(choose_solver(ds_sample)[0], expected)
+            #prediction of B&B time from the raw input (before the task is queued) agrees with the cost model
+            with open(sample_path.format(nitems)) as f:
+                knapsack_data = json.load(f)['knapsack_data']
+            self.assertAlmostEqual(predict_bb_seconds(knapsack_data),
+                                   predict_costs(instance_features(ds_sample))['BRANCH_AND_BOUND'])
+
+        #fractional weights - DP table is sized by values, capacity sweep is impossible
+        ds.load_from_json({"num_items": 60, "capacity": 1000.5, "items": [
+            {"index": i, "value": 7 * i % 97 + 11, "weight": 7 * i % 97 + 1.5} for i in range(60)]})
+        solver_type, cost, features = choose_solver(ds)
+        self.assertEqual(solver_type, 'DYN_PROG_NUMPY')
+        self.assertEqual(features['integer_weights'], False)
+        with self.assertRaises(ValueError):
+            choose_solver(ds, capacities=[100])
+
+#results cached by former test runs must not be served
+@override_settings(KAAS_TASK_DONE={'BROKER': 'memory://'}, KAAS_RESULT_CACHE={'BACKEND': None})
 class TestApi(TestCase):
     """
     Tests for our API
@@ -151,6 +630,28 @@ class TestApi(TestCase):
         response = self.client_unauthorized.get(url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_api_task_list_get_cursor(self):
+        """
+        test of GET with keyset pagination
+        """
+        url = reverse('api_task_list')
+        all_ids = [task['id'] for task in self.client_authorized.get(url).json()]
+
+        response = self.client_authorized.get(url, {'limit': 1})
+        self.assertEqual([task['id'] for task in response.json()], all_ids[:1])
+        self.assertTrue('rel="next"' in response['Link'])
+        #the second page continues right behind the first one
+        response = self.client_authorized.get(url, {'limit': 1, 'cursor': response['X-Next-Cursor']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([task['id'] for task in response.json()], all_ids[1:2])
+        #the last page is empty and has no next one
+        response = self.client_authorized.get(url, {'limit': 1, 'cursor': response['X-Next-Cursor']})
+        self.assertEqual(response.json(), [])
+        self.assertFalse(response.has_header('X-Next-Cursor'))
+
+        response = self.client_authorized.get(url, {'cursor': 'nonsense'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_api_task_list_post(self):
         """
         test of POST
@@ -178,6 +679,346 @@ class TestApi(TestCase):
         response = self.client_unauthorized.post(url, format='json', data=data)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_api_task_list_post_parent(self):
+        """
+        test of POST of re-solve of a parent task, DP resumes from the parent's table with default solver options
+        """
+        from knapsack import celery
+        celery.app.conf.CELERY_ALWAYS_EAGER = True
+
+        url = reverse('api_task_list')
+        with open(TEST_FILE_PATH) as f:
+            knapsack_data = json.load(f)
+        with tempfile.TemporaryDirectory() as location, \
+                override_settings(KAAS_DP_TABLES={'LOCATION': location}, KAAS_RESULT_CACHE={'BACKEND': None}):
+            data = {"solver_type": "DYN_PROG_NUMPY", "knapsack_data": knapsack_data}
+            parent_id = self.client_authorized.post(url, format='json', data=data).json()['id']
+
+            #the same inventory with one more item
+            knapsack_data = dict(knapsack_data, num_items=23, items=knapsack_data['items'] + [
+                {"index": 22, "value": 1, "weight": 1}])
+            data = {"solver_type": "DYN_PROG_NUMPY", "knapsack_data": knapsack_data, "parent_task_id": parent_id}
+            task_id = self.client_authorized.post(url, format='json', data=data).json()['id']
+
+        task = KnapsackTask.objects.get(id=task_id)
+        self.assertEqual(str(task.parent_task_id), parent_id)
+        self.assertEqual(task.result_info['dp_reused_items'], 22)
+        self.assertEqual(task.result_value, 1031)
+
+    def test_api_task_list_post_auto(self):
+        """
+        test of POST of AUTO task, the chosen engine and its predicted cost are recorded
+        """
+        from knapsack import celery
+        celery.app.conf.CELERY_ALWAYS_EAGER = True
+
+        url = reverse('api_task_list')
+        data = {"solver_type": "AUTO", "init_kwargs": {"epsilon": 0.1}, "knapsack_data": {"num_items": 2, "capacity": 10,
+                "items": [{"index": 0, "value": 8, "weight": 4}, {"index": 1, "value": 10, "weight": 5}]}}
+        response = self.client_authorized.post(url, format='json', data=data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        kt = KnapsackTask.objects.get(id=response.json()['id'])
+        self.assertEqual(kt.solver_type, 'AUTO')
+        self.assertTrue(kt.solver_engine in ('DYN_PROG_NUMPY', 'BRANCH_AND_BOUND', 'FPTAS'))
+        self.assertTrue(kt.predicted_cost is not None)
+        self.assertEqual(kt.result_value, 18)
+
+        #options of particular engines are not accepted
+        data['init_kwargs'] = {"max_nodes": 10}
+        response = self.client_authorized.post(url, format='json', data=data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(KAAS_RESULT_CACHE={'BACKEND': 'memory'})
+    def test_api_task_list_post_cached(self):
+        """
+        test of POST of the same instance twice, the second one is served from cache
+        """
+        from knapsack import celery
+        celery.app.conf.CELERY_ALWAYS_EAGER = True
+
+        url = reverse('api_task_list')
+        data = {"solver_type": "DYN_PROG", "knapsack_data": {"num_items": 3, "capacity": 10, "items": [
+            {"index": 0, "value": 8, "weight": 4}, {"index": 1, "value": 10, "weight": 5},
+            {"index": 2, "value": 3, "weight": 3}]}}
+        response = self.client_authorized.post(url, format='json', data=data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.json()['cache_hit'])
+
+        #the same items in different order are the same instance
+        data['knapsack_data']['items'].reverse()
+        response = self.client_authorized.post(url, format='json', data=data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        res_json = response.json()
+        self.assertTrue(res_json['cache_hit'])
+        self.assertEqual(res_json['celery_task_id'], '')
+
+        kt = KnapsackTask.objects.get(id=res_json['id'])
+        self.assertTrue(kt.cache_hit)
+        self.assertEqual(kt.status, 'SUCCESS')
+        self.assertEqual(kt.result_value, 18)
+        self.assertEqual(sorted(item['index'] for item in kt.result_items), [0, 1])
+
+        #cost model is not run for a cached instance, AUTO task reports the engine which solved it
+        for solver_type in ('BRANCH_AND_BOUND', 'AUTO'):
+            data['solver_type'] = solver_type
+            first = KnapsackTask.objects.get(id=self.client_authorized.post(url, format='json', data=data).json()['id'])
+            self.assertFalse(first.cache_hit)
+            res_json = self.client_authorized.post(url, format='json', data=data).json()
+            kt = KnapsackTask.objects.get(id=res_json['id'])
+            self.assertTrue(kt.cache_hit)
+            self.assertEqual(kt.predicted_cost, None)
+            self.assertEqual(kt.solver_engine, first.solver_engine)
+            self.assertEqual(kt.result_value, 18)
+
+    def test_api_task_list_post_cached_by_worker(self):
+        """
+        test of the default result cache shared by processes - a result cached by another process
+        (i.e. a worker) serves the same instance submitted to this one
+        """
+        url = reverse('api_task_list')
+        data = {"solver_type": "GREEDY", "knapsack_data": {"num_items": 2, "capacity": 10, "items": [
+            {"index": 0, "value": 8, "weight": 4}, {"index": 1, "value": 10, "weight": 5}]}}
+        worker = (
+            "import json, os, sys, django\n"
+            "os.environ['DJANGO_SETTINGS_MODULE'] = 'knapsack.settings'\n"
+            "django.setup()\n"
+            "from django.conf import settings\n"
+            "from kaas.cache import get_result_cache, instance_hash\n"
+            "settings.KAAS_RESULT_CACHE = json.loads(sys.argv[1])\n"
+            "data = json.loads(sys.argv[2])\n"
+            "get_result_cache().set(instance_hash(data['solver_type'], data['knapsack_data']), {\n"
+            "    'result_value': 18, 'result_weight': 9, 'result_items': data['knapsack_data']['items'],\n"
+            "    'result_info': {}})\n")
+
+        with tempfile.TemporaryDirectory() as location:
+            config = dict(project_settings.KAAS_RESULT_CACHE, LOCATION=location)  # shipped backend, test directory
+            subprocess.check_call([sys.executable, '-c', worker, json.dumps(config), json.dumps(data)],
+                                  cwd=os.path.dirname(os.path.abspath(THIS_MODULE_PATH)))
+            with override_settings(KAAS_RESULT_CACHE=config):
+                response = self.client_authorized.post(url, format='json', data=data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.json()['cache_hit'])
+        self.assertEqual(KnapsackTask.objects.get(id=response.json()['id']).result_value, 18)
+
+    def test_api_task_batch(self):
+        """
+        test of batch POST and batch progress GET
+        """
+        from knapsack import celery
+        celery.app.conf.CELERY_ALWAYS_EAGER = True
+
+        url = reverse('api_task_batch')
+        task = {"solver_type": "GREEDY", "knapsack_data": {"num_items": 2, "capacity": 9, "items": [
+            {"index": 0, "value": 7, "weight": 4}, {"index": 1, "value": 9, "weight": 5}]}}
+        invalid_task = {"solver_type": "GREEDY", "knapsack_data": {"num_items": 3, "capacity": 9, "items": []}}
+
+        #nothing is submitted if any task is invalid
+        response = self.client_authorized.post(url, format='json', data={"tasks": [task, invalid_task]})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(response.json()['error'].keys()), ['1'])
+
+        response = self.client_authorized.post(url, format='json', data={"tasks": [task, task, task]})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        res_json = response.json()
+        self.assertEqual(len(res_json['ids']), 3)
+        self.assertEqual(KnapsackTask.objects.filter(batch_id=res_json['batch_id']).count(), 3)
+        #small tasks were solved by a single micro batch task
+        tasks = KnapsackTask.objects.filter(batch_id=res_json['batch_id'])
+        self.assertEqual(len(set(kt.celery_task_id for kt in tasks)), 1)
+        for kt in tasks:
+            self.assertEqual(kt.status, 'SUCCESS')
+            self.assertEqual(kt.result_value, 16)
+            self.assertEqual(sorted(item['index'] for item in kt.result_items), [0, 1])
+
+        url = reverse('api_task_batch_detail', args=(res_json['batch_id'],))
+        response = self.client_authorized.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        res_json = response.json()
+        self.assertEqual(res_json['total'], 3)
+        self.assertEqual(res_json['done'], 3)
+        self.assertEqual(res_json['statuses'], {'SUCCESS': 3})
+
+        #unauthorized user
+        response = self.client_unauthorized.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_queue_routing(self):
+        """
+        test of routing tasks to queue tiers by their estimated cost
+        """
+        from kaas.tasks import estimate_cost, queue_options
+        self.assertEqual(queue_options(estimate_cost('GREEDY', 10, 100))['queue'], 'knapsack_interactive')
+        self.assertEqual(queue_options(estimate_cost('DYN_PROG', 1000, 10**5))['queue'], 'knapsack_solvers')
+        self.assertEqual(queue_options(estimate_cost('DYN_PROG', 10**5, 10**6))['queue'], 'knapsack_heavy')
+        #capacity sweep is as expensive as its largest capacity
+        self.assertEqual(estimate_cost('DYN_PROG_NUMPY', 100, 10, {'capacities': [5, 1000]}),
+                         estimate_cost('DYN_PROG_NUMPY', 100, 1000))
+        self.assertEqual(estimate_cost('DYN_PROG_NUMPY', 100, 1000, {'capacities': [5, 10]}),
+                         estimate_cost('DYN_PROG_NUMPY', 100, 1000))
+        #B&B may be exponential, only its predicted run time lets it to the interactive tier
+        self.assertEqual(queue_options(estimate_cost('BRANCH_AND_BOUND', 100, 10))['queue'], 'knapsack_solvers')
+        self.assertEqual(queue_options(estimate_cost('BRANCH_AND_BOUND', 100, 10, seconds=0.001))['queue'],
+                         'knapsack_interactive')
+        self.assertEqual(queue_options(estimate_cost('DYN_PROG', 10, 10))['time_limit'], 20)
+
+    @override_settings(KAAS_RESULT_BUFFER={'SIZE': 2, 'INTERVAL': 60}, KAAS_RESULT_CACHE={'BACKEND': None})
+    def test_api_task_result_buffer(self):
+        """
+        test of buffered saving of results, they are saved together when the buffer is full
+        """
+        from knapsack import celery
+        celery.app.conf.CELERY_ALWAYS_EAGER = True
+
+        url = reverse('api_task_list')
+        data = {"solver_type": "GREEDY", "knapsack_data": {"num_items": 2, "capacity": 10, "items": [
+            {"index": 0, "value": 8, "weight": 4}, {"index": 1, "value": 10, "weight": 5}]}}
+        first_id = self.client_authorized.post(url, format='json', data=data).json()['id']
+        self.assertFalse(KnapsackTask.objects.get(id=first_id).done)
+
+        second_id = self.client_authorized.post(url, format='json', data=data).json()['id']
+        for kt in KnapsackTask.objects.filter(id__in=[first_id, second_id]):
+            self.assertEqual(kt.status, 'SUCCESS')
+            self.assertEqual(kt.result_value, 18)
+            self.assertEqual(kt.result_nitems, 2)
+            #total duration computed from task_created sent with the task
+            self.assertEqual(kt.task_total_duration, kt.task_solve_end - kt.task_created)
+
+    @override_settings(KAAS_RESULT_CACHE={'BACKEND': None})
+    def test_task_result_single_update(self):
+        """
+        test of saving a result without reading the task row
+        """
+        from kaas.tasks import solve_knapsack
+        task = KnapsackTask.objects.all()[0]
+        end = task.task_created + timedelta(seconds=3)
+        retval = (8, 4, [{"index": 0, "value": 8, "weight": 4}], end - timedelta(seconds=1), end, {})
+        with self.assertNumQueries(1):
+            solve_knapsack.on_success(retval, 'f5b7ab60-fb8b-4b4e-9a8e-5e5d6b0cbd3a', ('GREEDY', {}, task.id),
+                                      {'task_created': task.task_created.isoformat()})
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'SUCCESS')
+        self.assertEqual(task.task_total_duration, timedelta(seconds=3))
+        self.assertEqual(task.task_solution_duration, timedelta(seconds=1))
+
+    def test_task_batch_results(self):
+        """
+        test of results of micro batch - saved in bulk without reading task rows, those solved before
+        the time limit is hit are kept and the rest fails
+        """
+        from celery.exceptions import SoftTimeLimitExceeded
+        from kaas import tasks
+        data = {"num_items": 2, "capacity": 9, "items": [
+            {"index": 0, "value": 7, "weight": 4}, {"index": 1, "value": 9, "weight": 5}]}
+        rows = list(KnapsackTask.objects.all()[:3])
+        KnapsackTask.objects.filter(id__in=[kt.id for kt in rows]).update(done=False, status='CREATED')
+        jobs = [('GREEDY', data, kt.id, {}, '', kt.task_created.isoformat()) for kt in rows]
+
+        with self.assertNumQueries(1):  # one UPDATE of all rows
+            self.assertEqual(tasks.solve_knapsack_batch.apply((jobs,)).get(), 3)
+        for kt in KnapsackTask.objects.filter(id__in=[kt.id for kt in rows]):
+            self.assertEqual(kt.status, 'SUCCESS')
+            self.assertEqual(kt.result_value, 16)
+
+        KnapsackTask.objects.filter(id__in=[kt.id for kt in rows]).update(done=False, status='CREATED')
+        build_solver = tasks._build_solver
+        calls = []
+
+        def timed_out(*args):
+            calls.append(args)
+            if len(calls) > 1:
+                raise SoftTimeLimitExceeded()
+            return build_solver(*args)
+
+        tasks._build_solver = timed_out
+        try:
+            result = tasks.solve_knapsack_batch.apply((jobs,))
+        finally:
+            tasks._build_solver = build_solver
+        self.assertTrue(result.failed())
+        self.assertEqual(len(calls), 2)  # the batch stopped at the time limit
+        statuses = [KnapsackTask.objects.get(id=kt.id).status for kt in rows]
+        self.assertEqual(statuses, ['SUCCESS', 'FAILURE', 'FAILURE'])
+        self.assertEqual(KnapsackTask.objects.get(id=rows[1].id).exception_class, 'SoftTimeLimitExceeded')
+
+    def test_task_batch_routing(self):
+        """
+        test of micro batching decided by estimated cost, not just by number of items
+        """
+        from kaas.tasks import MICRO_BATCH_MAX_ITEMS, MICRO_BATCH_MAX_COST, estimate_cost
+        from knapsack import celery
+        celery.app.conf.CELERY_ALWAYS_EAGER = True
+
+        small = {"solver_type": "GREEDY", "knapsack_data": {"num_items": 2, "capacity": 9, "items": [
+            {"index": 0, "value": 7, "weight": 4}, {"index": 1, "value": 9, "weight": 5}]}}
+        expensive = {"solver_type": "DYN_PROG", "knapsack_data": {"num_items": 2, "capacity": 10**5, "items": [
+            {"index": 0, "value": 7, "weight": 4}, {"index": 1, "value": 9, "weight": 5}]}}
+        self.assertTrue(2 < MICRO_BATCH_MAX_ITEMS)
+        self.assertTrue(estimate_cost('DYN_PROG', 2, 10**5) > MICRO_BATCH_MAX_COST)
+
+        response = self.client_authorized.post(reverse('api_task_batch'), format='json',
+                                               data={"tasks": [small, expensive, small]})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        small_ids, expensive_id = response.json()['ids'][::2], response.json()['ids'][1]
+        small_tasks = KnapsackTask.objects.filter(id__in=small_ids)
+        self.assertEqual(len(set(kt.celery_task_id for kt in small_tasks)), 1)
+        expensive_task = KnapsackTask.objects.get(id=expensive_id)
+        self.assertNotEqual(expensive_task.celery_task_id, small_tasks[0].celery_task_id)
+        self.assertEqual(expensive_task.status, 'SUCCESS')
+        self.assertEqual(expensive_task.result_value, 16)
+
+    @override_settings(KAAS_BLOB_STORE={'BACKEND': 'database', 'MIN_SIZE': 0},
+                       KAAS_RESULT_CACHE={'BACKEND': None})
+    def test_api_task_blobs(self):
+        """
+        test of input and result items kept in blob store
+        """
+        from knapsack import celery
+        celery.app.conf.CELERY_ALWAYS_EAGER = True
+
+        url = reverse('api_task_list')
+        data = {"solver_type": "DYN_PROG_NUMPY", "knapsack_data": {"num_items": 2, "capacity": 10, "items": [
+            {"index": 0, "value": 8, "weight": 4}, {"index": 1, "value": 10, "weight": 5}]}}
+        first_id = self.client_authorized.post(url, format='json', data=data).json()['id']
+        second_id = self.client_authorized.post(url, format='json', data=data).json()['id']
+        first, second = KnapsackTask.objects.get(id=first_id), KnapsackTask.objects.get(id=second_id)
+        self.assertEqual(first.input, [])
+        self.assertTrue(first.input_hash)
+        self.assertEqual(first.result_nitems, 2)
+        #identical data are stored just once
+        self.assertEqual(first.input_hash, second.input_hash)
+        self.assertEqual(Blob.objects.filter(hash=first.input_hash).count(), 1)
+
+        #detail just refers to the data in blob store
+        response = self.client_authorized.get(reverse('api_task_detail', args=(first_id,)))
+        self.assertEqual(response.json()['input'], None)
+        self.assertEqual(response.json()['result_items'], None)
+        self.assertTrue(response.json()['input_url'].endswith(reverse('api_task_blob', args=(first_id, 'input'))))
+
+        #the data are streamed on their own, compressed if the client accepts it
+        url = reverse('api_task_blob', args=(first_id, 'input'))
+        response = self.client_authorized.get(url)
+        self.assertEqual(json.loads(b''.join(response.streaming_content).decode()), data['knapsack_data']['items'])
+        response = self.client_authorized.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(b''.join(response.streaming_content)).decode()),
+                         data['knapsack_data']['items'])
+
+        #compaction keeps blobs of best-so-far items too
+        first.set_blob_field('incumbent_items', [{"index": 1, "value": 10, "weight": 5}])
+        first.save()
+        call_command('compact_blobs', grace=0, stdout=io.StringIO())
+        self.assertTrue(Blob.objects.filter(hash=first.incumbent_items_hash).exists())
+        self.assertTrue(Blob.objects.filter(hash=first.input_hash).exists())
+
+        #a missing blob is not found instead of breaking the stream
+        Blob.objects.filter(hash=first.input_hash).delete()
+        response = self.client_authorized.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        #unauthorized user
+        response = self.client_unauthorized.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
     def test_api_task_detail_get(self):
         """
         test of GET
@@ -190,11 +1031,54 @@ class TestApi(TestCase):
         res_json = response.json()
         #lets try some property...
         self.assertEqual(res_json['celery_task_id'], task.celery_task_id)
+        #small items are inlined
+        self.assertEqual(res_json['input'], task.input)
 
         #unauthorized user
         response = self.client_unauthorized.get(url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_api_task_detail_get_wait(self):
+        """
+        test of GET waiting for completion signal
+        """
+        from knapsack import celery
+        celery.app.conf.CELERY_ALWAYS_EAGER = True
+
+        data = {"solver_type": "DYN_PROG", "knapsack_data": {"num_items": 2, "capacity": 10, "items": [
+            {"index": 0, "value": 8, "weight": 4}, {"index": 1, "value": 10, "weight": 5}]}}
+        task_id = self.client_authorized.post(reverse('api_task_list'), format='json', data=data).json()['id']
+        url = reverse('api_task_detail', args=(task_id,))
+        response = self.client_authorized.get(url, {'wait': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['status'], 'SUCCESS')
+        self.assertTrue(KnapsackTask.objects.get(id=task_id).celery_task_id)  # known since dispatch
+
+        #unfinished task is awaited until the timeout
+        KnapsackTask.objects.filter(id=task_id).update(done=False, status='CREATED', celery_task_id='')
+        response = self.client_authorized.get(url, {'wait': 0.1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['status'], 'CREATED')
+
+        #...or until it is signalled as done (the row is not changed by the thread, so it is read as it is)
+        timer = threading.Timer(0.2, publish_done, args=([task_id],))
+        timer.start()
+        start = time.monotonic()
+        response = self.client_authorized.get(url, {'wait': 5})
+        timer.join()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLess(time.monotonic() - start, 4)
+
+        #signals of other tasks are not received
+        with TaskDoneSubscription(task_id) as subscription:
+            publish_done([KnapsackTask.objects.exclude(id=task_id).first().id])
+            self.assertFalse(subscription.wait(0.1))
+            publish_done([task_id])
+            self.assertTrue(subscription.wait(1))
+
+        response = self.client_authorized.get(url, {'wait': 'forever'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_api_task_detail_delete(self):
         """
         test of DELETE